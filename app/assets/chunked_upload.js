@@ -0,0 +1,99 @@
+// Streaming, resumable document upload.
+//
+// The file is sent to /upload/<id> in fixed-size raw chunks instead of a
+// base64 data URL through dcc.Upload. Once the server has the whole file the
+// hidden upload-complete button is clicked, which triggers the Dash upload
+// callback for this browser session.
+(function() {
+    const CHUNK_SIZE = 1024 * 1024;
+    const MAX_RETRIES = 5;
+
+    function setStatus(text) {
+        const status = document.getElementById('upload-status');
+        if (status) status.textContent = text;
+    }
+
+    function hash(text) {
+        // FNV-1a, only used to derive a stable id so retries resume the same upload
+        let h = 0x811c9dc5;
+        for (let i = 0; i < text.length; i++) {
+            h ^= text.charCodeAt(i);
+            h = Math.imul(h, 0x01000193) >>> 0;
+        }
+        return h.toString(16).padStart(8, '0');
+    }
+
+    function sleep(ms) {
+        return new Promise(function(resolve) { setTimeout(resolve, ms); });
+    }
+
+    async function requestJson(url, options) {
+        const response = await fetch(url, options);
+        const data = await response.json().catch(function() { return {}; });
+        return {response: response, data: data};
+    }
+
+    async function sendChunks(file, uploadId, sessionId) {
+        let offset = (await requestJson('/upload/' + uploadId)).data.offset || 0;
+        while (offset < file.size) {
+            const chunk = file.slice(offset, offset + CHUNK_SIZE);
+            const result = await requestJson('/upload/' + uploadId + '?offset=' + offset, {
+                method: 'PUT',
+                headers: {'Content-Type': 'application/octet-stream', 'X-Upload-Session': sessionId},
+                body: chunk
+            });
+            // 409 means the server has a different offset, resume from there
+            if (!result.response.ok && result.response.status !== 409) {
+                throw new Error(result.data.error || result.response.statusText);
+            }
+            offset = result.data.offset;
+            setStatus('Uploading ' + file.name + ': ' + Math.floor(100 * offset / file.size) + '%');
+        }
+    }
+
+    async function uploadFile(file, sessionId) {
+        const uploadId = sessionId.slice(0, 36) + '-' +
+            hash(file.name + ':' + file.size + ':' + file.lastModified);
+
+        for (let attempt = 0; ; attempt++) {
+            try {
+                await sendChunks(file, uploadId, sessionId);
+                const result = await requestJson('/upload/' + uploadId + '/complete', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({session: sessionId, filename: file.name, size: file.size})
+                });
+                if (!result.response.ok) {
+                    throw new Error(result.data.error || result.response.statusText);
+                }
+                break;
+            } catch (err) {
+                if (attempt >= MAX_RETRIES || /too large|Unsupported|another session/.test(err.message)) {
+                    setStatus('Upload failed: ' + err.message);
+                    return;
+                }
+                setStatus('Connection problem, resuming upload...');
+                await sleep(1000 * Math.pow(2, attempt));
+            }
+        }
+
+        setStatus('');
+        const trigger = document.getElementById('upload-complete-btn');
+        if (trigger) trigger.click();
+    }
+
+    document.addEventListener('click', function(event) {
+        const button = event.target.closest('#upload-button');
+        if (!button) return;
+
+        const input = document.createElement('input');
+        input.type = 'file';
+        input.accept = '.pdf,.txt,.md,.docx';
+        input.addEventListener('change', function() {
+            if (input.files.length) {
+                uploadFile(input.files[0], button.closest('[data-session]').dataset.session);
+            }
+        });
+        input.click();
+    });
+})();
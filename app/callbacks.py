@@ -1,115 +1,248 @@
-from dash import Input, Output, State, ctx
+from dash import Input, Output, State, ctx, no_update, Patch
 from dash import html, dcc
 from dash.exceptions import PreventUpdate
-import json
-import base64
-import docx2txt
-import io
-from datetime import datetime
-from services.document_processor import DocumentProcessor
+import time
+import uuid
 from services.vector_store import VectorStoreService
-from services.llm_service import LLMService
+from services.llm_service import LLMService, ResponseCancelled
+from services.transcript_store import TranscriptStore
+from services.session_store import SessionStore
+from services.ingestion_jobs import IngestionJobs
+from services.highlight_tasks import HighlightTasks
+from services.query_generations import QueryGenerations, QueryCancelled
 from utils.visualization import DocumentVisualizer
-from utils.text_helpers import TextProcessor
 from app import config
 
-MAX_DOC_SIZE = 50 * 1024 * 1024
-
-# Initialize global variables
-original_document_content = None
-global_images = []
-global_tables = []
-DocProc = DocumentProcessor()
-
-def parse_contents(contents, filename):
-    """Parse uploaded file contents"""
-    try:
-        content_type, content_string = contents.split(",")
-        decoded = base64.b64decode(content_string)
-
-        if len(decoded) > MAX_DOC_SIZE:
-            raise Exception("File too large (max 50MB)")
-
-        if filename.lower().endswith('.pdf'):
-            content = DocProc._extract_text_with_layout(decoded)
-            images = DocProc._extract_images(decoded)
-            tables = DocProc._extract_tables(decoded)
-            plain_text = "\n".join(
-                " ".join(span["text"] for spans in page for span in spans)
-                for page in content
-            )
-            return content, images, tables, plain_text
+# Per-session document state lives server-side, keyed by the vectorstore session id
+session_state = SessionStore()
+transcripts = TranscriptStore()
+ingestion_jobs = IngestionJobs()
+query_generations = QueryGenerations(session_state)
+highlight_tasks = HighlightTasks(session_state)
 
-        elif filename.lower().endswith(('.txt', '.md')):
-            content = decoded.decode("utf-8")
-            return content, [], [], content
+def ingestion_progress(status):
+    """Return (percent, message) for an ingestion job status"""
+    pages_total = status.get("pages_total") or 0
+    pages_done = status.get("pages_extracted") or 0
+    chunks_done = status.get("chunks_embedded") or 0
 
-        elif filename.lower().endswith('.docx'):
-            content = docx2txt.process(io.BytesIO(decoded))
-            return content, [], [], content
+    # Reported when embedding goes through the worker pool
+    pool = status.get("embedding")
+    pool_note = (
+        f" ({pool['texts_per_second']:.0f} texts/s on {pool['workers']} workers, "
+        f"{pool['queue_depth']} batches queued)"
+        if pool else ""
+    )
 
-        else:
-            raise Exception("Unsupported file type")
+    if status["state"] == "queued":
+        return 0, "Waiting for a free ingestion slot..."
+
+    if status["state"] == "indexing lines":
+        lines_total = status.get("lines_total") or 0
+        lines_done = status.get("lines_embedded") or 0
+        percent = 100 * lines_done / lines_total if lines_total else 100
+        return percent, f"Preparing highlighting: {lines_done}/{lines_total or '?'} lines{pool_note}"
+
+    # Embedding runs alongside extraction, so extracted pages drive the bar
+    percent = 100 * pages_done / pages_total if pages_total else 0
+    message = f"Extracted {pages_done}/{pages_total or '?'} pages, embedded {chunks_done} chunks{pool_note}"
+    return percent, message
+
+def load_document_pages(session_id):
+    """Return the blocks of every page of a session extracted so far"""
+    page_count = session_state.get(session_id, "page_count", 0)
+    return [session_state.get(session_id, f"page-{page_num}", []) for page_num in range(page_count)]
+
+def coverage_note(session_id):
+    """Describe which part of a still-ingesting document an answer is based on"""
+    coverage = session_state.get(session_id, "coverage")
+    if not coverage or coverage["complete"]:
+        return ""
+    return (
+        f" (Document still being processed: this answer covers {coverage['unit']} "
+        f"1-{coverage['pages_indexed']} of {coverage['pages_total'] or '?'})"
+    )
+
+def compute_answer_highlights(session_id, chunks, chunk_ids, assistant_reply, check_cancelled):
+    """Work out the highlight state of an answer (runs as a background highlight task)"""
+    # Only the highlighted ids travel back; the rendered document stays in the browser
+    vect_serv = VectorStoreService()
+    doc_viz = DocumentVisualizer()
+    top_chunks = chunks[:2]
+    refine = config.VIEWER_CONFIG['refine_highlights']
+
+    if top_chunks and all(chunk.get('sources') is not None for chunk in top_chunks):
+        # The blocks behind each chunk were recorded at ingestion
+        return doc_viz.lookup_highlights(
+            top_chunks,
+            assistant_reply,
+            refine=refine,
+            features=vect_serv.load_features(session_id) if refine else None,
+            check_cancelled=check_cancelled
+        )
+
+    features = vect_serv.load_features(session_id)
+    check_cancelled()
+    return doc_viz.compute_highlights(
+        load_document_pages(session_id) if features is None else [],
+        vect_serv.load_chunk_mapping(session_id, chunk_ids[:2]) if chunk_ids else {},
+        chunk_ids[:2],
+        assistant_reply,
+        features=features,
+        check_cancelled=check_cancelled
+    )
 
-    except Exception as e:
-        raise Exception(f"Error in parse_contents: {str(e)}")
+def patch_page_window(pages_patch, session_id, old_window, new_window, page_count):
+    """Swap placeholders and rendered pages for the pages entering or leaving the window"""
+    doc_viz = DocumentVisualizer()
+    old_start, old_end = old_window or (0, 0)
+    start, end = new_window
+
+    for page_num in range(old_start, min(old_end, page_count)):
+        if not start <= page_num < end:
+            pages_patch[page_num] = doc_viz.render_placeholder(page_num)
+    for page_num in range(start, min(end, page_count)):
+        if not old_start <= page_num < old_end:
+            page_blocks = session_state.get(session_id, f"page-{page_num}", [])
+            pages_patch[page_num] = doc_viz.render_page(page_blocks, page_num)
 
 def register_callbacks(app):
     """Register all application callbacks"""
 
     @app.callback(
-        [Output("document-viewer", "children"),
+        [Output("document-pages", "children"),
+         Output("viewer-window", "data"),
+         Output("viewer-page-count", "data"),
          Output("vectorstore-state", "data"),
-         Output("chunk-mapping-state", "data"),
          Output("chat-history", "children"),
-         Output("upload-document", "contents")],
-        [Input("upload-document", "contents")],
-        [State("upload-document", "filename"),
-         State("chat-history", "children")]
+         Output("highlight-state", "data"),
+         Output("ingest-job", "data"),
+         Output("ingest-poll", "disabled"),
+         Output("ingest-progress", "style"),
+         Output("query-input", "disabled"),
+         Output("submit-btn", "disabled")],
+        [Input("upload-complete-btn", "n_clicks")],
+        [State("browser-session", "data")]
     )
-    def handle_document_upload(contents, filename, existing_chat_history):
-        if not contents:
+    def handle_document_upload(n_clicks, browser_session):
+        # The file itself was streamed to disk by the /upload routes
+        upload = session_state.get(browser_session, "upload")
+        if not n_clicks or not upload:
             raise PreventUpdate
+        session_state.delete(browser_session, "upload")
+        filename = upload["filename"]
 
+        # Chat history is append-only on the wire
+        chat_patch = Patch()
         try:
-            global original_document_content, global_images, global_tables
+            # Ingestion runs in the job queue, this callback only submits it
+            session_id = str(uuid.uuid4())
+            job_id = ingestion_jobs.submit(session_id, upload["path"], filename)
 
-            content, images, tables, plain_text = parse_contents(contents, filename)
-            original_document_content = content
-            global_images = images or []
-            global_tables = tables or []
+            chat_patch.append(html.P(f"Processing {filename}..."))
+            job = {"job_id": job_id, "session_id": session_id, "filename": filename}
+            # Questions are accepted again once a partial index is searchable
+            return [], None, 0, None, chat_patch, None, job, False, {"display": "block"}, True, True
 
-            vect_serv = VectorStoreService()
-            session_id, chunk_mapping = vect_serv.create_vectorstore_and_mapping(plain_text)
+        except Exception as e:
+            chat_patch.append(html.P(f"Error: {str(e)}"))
+            return (no_update, no_update, no_update, no_update, chat_patch, no_update, None, True,
+                    {"display": "none"}, no_update, no_update)
+
+    @app.callback(
+        [Output("ingest-progress-bar", "value"),
+         Output("ingest-progress-text", "children"),
+         Output("ingest-progress", "style", allow_duplicate=True),
+         Output("ingest-poll", "disabled", allow_duplicate=True),
+         Output("document-pages", "children", allow_duplicate=True),
+         Output("viewer-window", "data", allow_duplicate=True),
+         Output("viewer-page-count", "data", allow_duplicate=True),
+         Output("vectorstore-state", "data", allow_duplicate=True),
+         Output("chat-history", "children", allow_duplicate=True),
+         Output("query-input", "disabled", allow_duplicate=True),
+         Output("submit-btn", "disabled", allow_duplicate=True)],
+        [Input("ingest-poll", "n_intervals")],
+        [State("ingest-job", "data"),
+         State("viewer-window", "data"),
+         State("viewer-page-count", "data"),
+         State("visible-page", "data"),
+         State("vectorstore-state", "data")],
+        prevent_initial_call=True
+    )
+    def poll_ingestion(n_intervals, job, window, shown_page_count, visible_page, vectorstore_state):
+        if not job:
+            raise PreventUpdate
+
+        status = ingestion_jobs.status(job["job_id"])
+        if not status:
+            raise PreventUpdate
+
+        hidden = {"display": "none"}
+        chat_patch = Patch()
 
+        if status["state"] == "error":
+            chat_patch.append(html.P(f"Error: {status.get('error')}"))
+            return 0, "", hidden, True, no_update, no_update, no_update, no_update, chat_patch, False, False
+
+        if status["state"] == "cancelled":
+            chat_patch.append(html.P(f"Processing of {job['filename']} cancelled"))
+            return 0, "", hidden, True, no_update, no_update, no_update, no_update, chat_patch, False, False
+
+        # Append the pages extracted since the last poll, rendering those inside the window
+        session_id = job["session_id"]
+        shown_page_count = shown_page_count or 0
+        page_count = session_state.get(session_id, "page_count", 0)
+        pages_patch = no_update
+        new_window = window
+
+        if page_count > shown_page_count:
             doc_viz = DocumentVisualizer()
-            doc_viewer_content = doc_viz.create_highlighted_content(
-                content, 
-                chunk_mapping, 
-                [], 
-                "", 
-                images=global_images, 
-                tables=global_tables
-            )
+            new_window = doc_viz.page_window(visible_page or 0, page_count, config.VIEWER_CONFIG['prefetch_pages'])
+            pages_patch = Patch()
+            for page_num in range(shown_page_count, page_count):
+                if new_window[0] <= page_num < new_window[1]:
+                    page_blocks = session_state.get(session_id, f"page-{page_num}", [])
+                    pages_patch.append(doc_viz.render_page(page_blocks, page_num))
+                else:
+                    pages_patch.append(doc_viz.render_placeholder(page_num))
+            patch_page_window(pages_patch, session_id, window, new_window, shown_page_count)
 
-            chat_history = existing_chat_history or []
-            chat_history.append(html.P("Document processed successfully"))
+        # The browser only holds the session handle, the chunk mapping stays server-side
+        searchable = status.get("searchable") and vectorstore_state != session_id
+        session_handle = session_id if searchable else no_update
+        query_disabled = False if searchable else no_update
 
-            return doc_viewer_content, session_id, json.dumps(chunk_mapping), chat_history, None
+        if status["state"] != "done":
+            percent, message = ingestion_progress(status)
+            return (percent, message, no_update, no_update, pages_patch, new_window, page_count,
+                    session_handle, no_update, query_disabled, query_disabled)
 
-        except Exception as e:
-            chat_history = existing_chat_history or []
-            chat_history.append(html.P(f"Error: {str(e)}"))
-            return None, None, None, chat_history, None
+        chat_patch.append(html.P("Document processed successfully"))
+        transcripts.append(session_id, "system", f"Document processed successfully: {job['filename']}")
+        return 100, "", hidden, True, pages_patch, new_window, page_count, session_id, chat_patch, False, False
+
+    @app.callback(
+        Output("ingest-progress-text", "children", allow_duplicate=True),
+        [Input("ingest-cancel-btn", "n_clicks")],
+        [State("ingest-job", "data")],
+        prevent_initial_call=True
+    )
+    def cancel_ingestion(n_clicks, job):
+        if not n_clicks or not job:
+            raise PreventUpdate
+
+        ingestion_jobs.cancel(job["job_id"])
+        return "Cancelling..."
 
     @app.callback(
         [Output("document-name", "children"),
          Output("document-name-chat", "children")],
-        [Input("upload-document", "filename")]
+        [Input("ingest-job", "data")]
     )
-    def update_document_names(filename):
-        if not filename:
+    def update_document_names(job):
+        if not job:
             raise PreventUpdate
+        filename = job["filename"]
 
         main_display = html.Div([
             html.I(className="fas fa-file me-2"),
@@ -119,75 +252,264 @@ def register_callbacks(app):
         chat_display = f"Current file: {filename}"
         return main_display, chat_display
 
+    @app.callback(
+        [Output("table-select", "options"),
+         Output("table-select", "value"),
+         Output("table-section", "style")],
+        [Input("ingest-poll", "disabled")],
+        [State("ingest-job", "data")],
+        prevent_initial_call=True
+    )
+    def list_tables(poll_disabled, job):
+        """Offer the tables of a document once its ingestion stopped"""
+        if not job:
+            raise PreventUpdate
+
+        tables = session_state.get(job["session_id"], "tables", []) if poll_disabled else []
+        if not tables:
+            return [], None, {"display": "none"}
+
+        options = [
+            {"label": f"Table {index + 1} ({len(df)} rows)", "value": index}
+            for index, df in enumerate(tables)
+        ]
+        return options, 0, {"display": "block"}
+
+    @app.callback(
+        [Output("table-view", "data"),
+         Output("table-view", "columns"),
+         Output("table-view", "page_count"),
+         Output("table-view", "page_current")],
+        [Input("table-select", "value"),
+         Input("table-view", "page_current"),
+         Input("table-view", "page_size"),
+         Input("table-view", "sort_by"),
+         Input("table-view", "filter_query")],
+        [State("ingest-job", "data")],
+        prevent_initial_call=True
+    )
+    def update_table_page(table_index, page_current, page_size, sort_by, filter_query, job):
+        """Send only the rows of the current page of the selected table"""
+        if not job or table_index is None:
+            raise PreventUpdate
+
+        tables = session_state.get(job["session_id"], "tables", [])
+        if table_index >= len(tables):
+            raise PreventUpdate
+        df = tables[table_index]
+
+        # A new table or filter starts again from its first page
+        if ctx.triggered_id == "table-select" or "table-view.filter_query" in ctx.triggered_prop_ids:
+            page_current = 0
+
+        data, page_count = DocumentVisualizer.query_table(df, page_current or 0, page_size, sort_by, filter_query)
+        columns = [{"name": col, "id": col} for col in df.columns]
+        return data, columns, page_count, page_current or 0
+
     @app.callback(
         [Output("chat-history", "children", allow_duplicate=True),
-         Output("document-viewer", "children", allow_duplicate=True),
-         Output("query-input", "value")],
+         Output("highlight-state", "data", allow_duplicate=True),
+         Output("query-input", "value"),
+         Output("highlight-query", "data"),
+         Output("highlight-poll", "disabled")],
         [Input("submit-btn", "n_clicks"),
          Input("query-input", "n_submit")],
         [State("query-input", "value"),
-         State("document-viewer", "children"),
-         State("chat-history", "children"),
-         State("vectorstore-state", "data"),
-         State("chunk-mapping-state", "data")],
+         State("vectorstore-state", "data")],
         prevent_initial_call=True
     )
-    def handle_query(n_clicks, n_submit, query, current_doc_view, chat_history, vectorstore_state, chunk_mapping_state):
+    def handle_query(n_clicks, n_submit, query, vectorstore_state):
         if not query:
             raise PreventUpdate
 
-        if not vectorstore_state or not chunk_mapping_state:
-            chat_history.append(html.P("Please upload a document first"))
-            return chat_history, current_doc_view, query
+        chat_patch = Patch()
+        if not vectorstore_state:
+            chat_patch.append(html.P("Please upload a document first"))
+            return chat_patch, no_update, query, no_update, no_update
 
+        # Starting a question supersedes the session's previous one, wherever
+        # it is running: retrieval, the LLM call and highlighting all stop
+        watch = query_generations.start(vectorstore_state)
+        highlights_submitted = False
         try:
             vect_serv = VectorStoreService()
             llm_serv = LLMService(*list(config.OPENAI_CONFIG.values())[1:])
 
             vectorstore, metadata = vect_serv.load_vectorstore(vectorstore_state)
-            chunk_mapping = json.loads(chunk_mapping_state)
 
             relevant_chunk_ids, context, all_chunks = vect_serv.get_relevant_chunks(vectorstore, query)
-            assistant_reply = llm_serv.get_response(context, query)
+            watch.check()
+            assistant_reply = llm_serv.get_response(context, query, cancelled=watch.cancelled)
+            watch.check()
 
-            doc_viz = DocumentVisualizer()
-            doc_viewer_content = doc_viz.create_highlighted_content(
-                original_document_content,
-                chunk_mapping,
-                relevant_chunk_ids[:2],
-                assistant_reply,
-                images=global_images,
-                tables=global_tables
+            # The answer goes out now; highlights follow from a background task
+            highlight_tasks.submit(
+                watch,
+                lambda check_cancelled: compute_answer_highlights(
+                    vectorstore_state, all_chunks, relevant_chunk_ids, assistant_reply, check_cancelled
+                )
             )
+            highlights_submitted = True
+            highlight_query = {"session_id": vectorstore_state, "query_id": watch.query_id, "started": time.time()}
 
-            chat_history.extend([
+            chat_patch.extend([
                 html.P(f"User: {query}"),
-                html.P(f"Assistant: {assistant_reply}"),
+                html.P(f"Assistant: {assistant_reply}{coverage_note(vectorstore_state)}"),
                 html.Hr()
             ])
-            return chat_history, doc_viewer_content, ""
+            transcripts.append(vectorstore_state, "user", query)
+            transcripts.append(vectorstore_state, "assistant", assistant_reply)
+            # Clear the previous answer's highlights until the new ones arrive
+            return chat_patch, None, "", highlight_query, False
+
+        except (QueryCancelled, ResponseCancelled):
+            # Only the latest question's answer is rendered
+            raise PreventUpdate
 
         except Exception as e:
-            chat_history.append(html.P(f"Error: {str(e)}"))
-            return chat_history, current_doc_view, query
+            chat_patch.append(html.P(f"Error: {str(e)}"))
+            return chat_patch, no_update, query, no_update, no_update
+
+        finally:
+            # Otherwise the highlight task finishes the question
+            if not highlights_submitted:
+                watch.finish()
+
+    @app.callback(
+        [Output("highlight-state", "data", allow_duplicate=True),
+         Output("highlight-poll", "disabled", allow_duplicate=True)],
+        [Input("highlight-poll", "n_intervals")],
+        [State("highlight-query", "data")],
+        prevent_initial_call=True
+    )
+    def poll_highlights(n_intervals, highlight_query):
+        """Push the highlights of the latest answer once the background task published them"""
+        if not highlight_query:
+            return no_update, True
+
+        record = highlight_tasks.result(highlight_query["session_id"], highlight_query["query_id"])
+        if record is None:
+            # Give up on a task lost with its worker
+            if time.time() - highlight_query["started"] > config.VIEWER_CONFIG['highlight_timeout_seconds']:
+                return no_update, True
+            raise PreventUpdate
+
+        if record["state"] != "done":
+            return no_update, True
+        return record["result"], True
+
+    @app.callback(
+        [Output("document-pages", "children", allow_duplicate=True),
+         Output("viewer-window", "data", allow_duplicate=True)],
+        [Input("visible-page", "data"),
+         Input("highlight-state", "data")],
+        [State("viewer-window", "data"),
+         State("viewer-page-count", "data"),
+         State("ingest-job", "data")],
+        prevent_initial_call=True
+    )
+    def load_visible_pages(visible_page, highlight_state, window, page_count, job):
+        """Swap placeholders for rendered pages around the visible (or highlighted) page"""
+        if not job or not page_count or not window:
+            raise PreventUpdate
+
+        if ctx.triggered_id == "highlight-state":
+            if not highlight_state or highlight_state.get("page") is None:
+                raise PreventUpdate
+            center = highlight_state["page"]
+        else:
+            if visible_page is None:
+                raise PreventUpdate
+            center = visible_page
 
-    # Scroll to highlighted section
+        doc_viz = DocumentVisualizer()
+        new_window = doc_viz.page_window(center, page_count, config.VIEWER_CONFIG['prefetch_pages'])
+        if new_window == window:
+            raise PreventUpdate
+
+        # Patch only the pages entering or leaving the window
+        pages_patch = Patch()
+        patch_page_window(pages_patch, job["session_id"], window, new_window, page_count)
+        return pages_patch, new_window
+
+    # Report the page at the middle of the viewer, without a server round trip
     app.clientside_callback(
         """
-        function(mostRelevantId) {
-            if (!mostRelevantId) return; // Exit if no relevant ID
-            
-            // Select the element with the given ID
-            const highlightedElement = document.getElementById(mostRelevantId);
-            if (highlightedElement) {
-                highlightedElement.scrollIntoView({
-                    behavior: 'smooth',
-                    block: 'center'
-                });
+        function(nIntervals, currentPage) {
+            const noUpdate = window.dash_clientside.no_update;
+            const viewer = document.getElementById('document-viewer');
+            if (!viewer) return noUpdate;
+
+            const pages = viewer.getElementsByClassName('doc-page');
+            if (!pages.length) return noUpdate;
+
+            // Binary search for the last page starting above the viewer midline
+            const viewerRect = viewer.getBoundingClientRect();
+            const probe = viewerRect.top + viewerRect.height / 2;
+            let lo = 0, hi = pages.length - 1, found = 0;
+            while (lo <= hi) {
+                const mid = (lo + hi) >> 1;
+                if (pages[mid].getBoundingClientRect().top <= probe) {
+                    found = mid;
+                    lo = mid + 1;
+                } else {
+                    hi = mid - 1;
+                }
+            }
+
+            const page = parseInt(pages[found].dataset.page, 10);
+            return page === currentPage ? noUpdate : page;
+        }
+        """,
+        Output("visible-page", "data"),
+        [Input("viewer-scroll-poll", "n_intervals")],
+        [State("visible-page", "data")],
+        prevent_initial_call=True
+    )
+
+    # Apply highlights to the rendered pages and scroll to the best match
+    app.clientside_callback(
+        """
+        function(highlightState, pages) {
+            const triggered = window.dash_clientside.callback_context.triggered || [];
+            if (triggered.some(function(t) { return t.prop_id === 'highlight-state.data'; })) {
+                window.pendingHighlightScroll = highlightState ? highlightState.scroll : null;
             }
+
+            // Wait for freshly patched pages to reach the DOM
+            setTimeout(function() {
+                const viewer = document.getElementById('document-viewer');
+                if (!viewer) return;
+
+                // Clear the highlights of the previous answer
+                viewer.querySelectorAll('.highlighted-text').forEach(function(el) {
+                    el.classList.remove('highlighted-text');
+                });
+
+                if (!highlightState) return;
+
+                (highlightState.ids || []).forEach(function(id) {
+                    const el = document.getElementById(id);
+                    if (el) el.classList.add('highlighted-text');
+                });
+
+                // The scroll target may live on a page that is still loading
+                if (window.pendingHighlightScroll) {
+                    const highlightedElement = document.getElementById(window.pendingHighlightScroll);
+                    if (highlightedElement) {
+                        highlightedElement.scrollIntoView({
+                            behavior: 'smooth',
+                            block: 'center'
+                        });
+                        window.pendingHighlightScroll = null;
+                    }
+                }
+            }, 0);
+            return '';
         }
         """,
         Output("scroll-trigger", "children"),
-        [Input("most-relevant-highlight", "value")],  # Trigger when the relevant ID changes
+        [Input("highlight-state", "data"),
+         Input("document-pages", "children")],
         prevent_initial_call=True
     )
@@ -28,8 +28,127 @@ TEXT_SPLITTER_CONFIG = {
     'separators': ["\n\n", "\n", ". ", " ", ""]
 }
 
-# Embeddings configuration
+# Embeddings configuration: 'torch' runs the model through HuggingFaceEmbeddings,
+# 'onnx' through ONNX Runtime (exported on first use into onnx_dir, optionally
+# int8-quantized), see scripts/benchmark_embeddings.py
 EMBEDDINGS_MODEL = {
     'name': "sentence-transformers/all-MiniLM-L6-v2",
-    'device': 'cpu'
-}
\ No newline at end of file
+    'device': 'cpu',
+    'backend': os.getenv('EMBEDDINGS_BACKEND', 'torch'),
+    'onnx_dir': TEMP_DIR.parent / 'onnx',
+    'quantize': os.getenv('EMBEDDINGS_QUANTIZE', 'false').lower() == 'true',
+    'max_length': 256  # the model's max_seq_length
+}
+
+# Document viewer configuration
+VIEWER_CONFIG = {
+    'prefetch_pages': 2,        # pages rendered on each side of the visible one
+    'sections_per_page': 40,    # virtual page size for text documents
+    'scroll_poll_ms': 500,
+    # Check the blocks found through the chunk offset index against the answer
+    'refine_highlights': os.getenv('REFINE_HIGHLIGHTS', 'false').lower() == 'true',
+    # Highlights are computed in the background after the answer is shown
+    'highlight_workers': 2,
+    'highlight_poll_ms': 300,
+    'highlight_timeout_seconds': 60,
+    # Extracted tables are paged, sorted and filtered server-side
+    'table_page_size': 25
+}
+
+
+# Chat transcript configuration, the browser only receives new messages
+TRANSCRIPT_CONFIG = {
+    'enabled': os.getenv('TRANSCRIPT_ENABLED', 'false').lower() == 'true',
+    'dir': TEMP_DIR.parent / 'transcripts'
+}
+
+
+# Per-session server-side state (document pages, images, tables)
+SESSION_STORE_CONFIG = {
+    'dir': TEMP_DIR.parent / 'sessions',
+    'max_memory_bytes': int(os.getenv('SESSION_STORE_MAX_MEMORY_MB', '256')) * 1024 * 1024,
+    'ttl_seconds': 3600,
+    'sweep_seconds': 60  # interval of the background expiry sweep
+}
+
+
+# Production server configuration (python -m app.serve)
+CPU_COUNT = os.cpu_count() or 1
+SERVER_CONFIG = {
+    'bind': os.getenv('BIND', '0.0.0.0:8050'),
+    'workers': int(os.getenv('WEB_WORKERS', str(CPU_COUNT))),
+    'max_requests': int(os.getenv('WEB_MAX_REQUESTS', '500')),  # recycle workers to cap memory growth
+    'max_requests_jitter': 50,
+    'timeout': 300,
+    'graceful_timeout': 30,
+    'preload_model': os.getenv('PRELOAD_MODEL', 'true').lower() == 'true'  # load the model before forking
+}
+# Split cores between workers so torch/BLAS pools do not oversubscribe them
+SERVER_CONFIG['threads_per_worker'] = int(
+    os.getenv('WEB_THREADS_PER_WORKER', str(max(1, CPU_COUNT // SERVER_CONFIG['workers'])))
+)
+# Fixed intra-op thread count of the ONNX Runtime embedding session
+EMBEDDINGS_MODEL['intra_op_threads'] = int(
+    os.getenv('EMBEDDINGS_THREADS', str(SERVER_CONFIG['threads_per_worker']))
+)
+
+
+# Background ingestion jobs
+INGESTION_CONFIG = {
+    'jobs_dir': TEMP_DIR.parent / 'jobs',
+    'max_concurrent': int(os.getenv('MAX_CONCURRENT_INGESTIONS', '2')),
+    'start_method': 'fork',  # pool processes share the preloaded embedding model (run single-threaded, see ingestion_jobs)
+    'poll_ms': 500,
+    'embed_batch_size': 32,  # chunks per embedding call in the ingestion pipeline
+    'queue_size': 8,         # items buffered between pipeline stages
+    'checkpoint_seconds': 2  # how often the partial index is saved for early queries
+}
+
+
+# Embedding worker pool: with EMBEDDING_POOL_WORKERS > 0, every process that
+# embeds (web workers, ingestion processes) shards its batches across that
+# many forked worker processes, results coming back through shared memory
+EMBEDDING_POOL_CONFIG = {
+    'workers': int(os.getenv('EMBEDDING_POOL_WORKERS', '0')),
+    'max_batch': INGESTION_CONFIG['embed_batch_size'],
+    'slots_per_worker': 2    # batches in flight per worker (each runs one torch thread)
+}
+
+
+# Chunked uploads are streamed to disk here before ingestion
+UPLOAD_CONFIG = {
+    'dir': TEMP_DIR.parent / 'uploads',
+    'chunk_size': 1024 * 1024,
+    'ttl_seconds': 3600  # abandoned partial uploads are removed after this
+}
+
+
+# Vector index directories are evicted in the background by the IndexJanitor
+INDEX_JANITOR_CONFIG = {
+    'quota_bytes': int(os.getenv('INDEX_DISK_QUOTA_MB', '2048')) * 1024 * 1024,
+    'ttl_seconds': 3600,
+    'interval_seconds': 60
+}
+
+
+# Where index bundles are kept so any node can serve any session:
+# 'local' (this node's TEMP_DIR only), 'shared' (a directory every node
+# mounts) or 's3' (any S3-compatible store, needs boto3; set
+# INDEX_S3_ENDPOINT_URL for e.g. a local MinIO). TEMP_DIR then acts as a
+# node-local read-through cache.
+# Only the index bundles are shared: the per-session state the browser polls
+# (ingestion progress, coverage, highlights, query generations) stays in the
+# node's SessionStore, so with several nodes the load balancer must keep a
+# browser session on one node (sticky sessions).
+STORAGE_CONFIG = {
+    'backend': os.getenv('INDEX_STORAGE', 'local'),
+    'shared_dir': os.getenv('INDEX_SHARED_DIR', ''),
+    's3_bucket': os.getenv('INDEX_S3_BUCKET', ''),
+    's3_prefix': os.getenv('INDEX_S3_PREFIX', 'indices'),
+    's3_endpoint_url': os.getenv('INDEX_S3_ENDPOINT_URL') or None,
+    'manifest_check_seconds': 5,  # how often a still-ingesting bundle is re-checked
+    # Minimum seconds between publishes of a bundle still being ingested (each
+    # one uploads the whole index and catalog export again), 0 publishes only
+    # complete bundles
+    'partial_publish_seconds': int(os.getenv('INDEX_PARTIAL_PUBLISH_SECONDS', '60'))
+}
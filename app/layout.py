@@ -1,9 +1,14 @@
-from dash import html, dcc
+from dash import html, dcc, dash_table
 import dash_bootstrap_components as dbc
+import uuid
+from app import config
 
 def create_layout():
     """Create the application layout with enhanced styling"""
     
+    # Served per page load, so every browser tab gets its own session
+    browser_session = str(uuid.uuid4())
+
     # Custom styles
     SHADOW_STYLE = "0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06)"
     CARD_STYLE = {
@@ -50,23 +55,28 @@ def create_layout():
                     dbc.Col(
                         dbc.Card(
                             [
-                                # Upload button with status
+                                # Upload button with status, files are streamed by assets/chunked_upload.js
                                 html.Div(
                                     [
-                                        dcc.Upload(
-                                            id="upload-document",
-                                            multiple=False,
-                                            children=dbc.Button(
-                                                [
-                                                    html.I(className="fas fa-upload me-2"),
-                                                    "Upload Document"
-                                                ],
-                                                color="primary",
-                                                size="lg",
-                                                className="w-100",
-                                                style={"box-shadow": SHADOW_STYLE}
-                                            ),
-                                            className="mb-3"
+                                        dbc.Button(
+                                            [
+                                                html.I(className="fas fa-upload me-2"),
+                                                "Upload Document"
+                                            ],
+                                            id="upload-button",
+                                            color="primary",
+                                            size="lg",
+                                            className="w-100 mb-3",
+                                            style={"box-shadow": SHADOW_STYLE}
+                                        ),
+                                        html.Div(
+                                            id="upload-status",
+                                            className="text-muted text-center small mb-2"
+                                        ),
+                                        html.Button(
+                                            id="upload-complete-btn",
+                                            n_clicks=0,
+                                            style={"display": "none"}
                                         ),
                                         # File status indicator below upload button
                                         html.Div(
@@ -75,7 +85,35 @@ def create_layout():
                                             style={"font-style": "italic"}
                                         )
                                     ],
-                                    className="text-center mb-4"
+                                    className="text-center mb-4",
+                                    **{"data-session": browser_session}
+                                ),
+
+                                # Ingestion progress, shown while a job is running
+                                html.Div(
+                                    [
+                                        dbc.Progress(
+                                            id="ingest-progress-bar",
+                                            value=0,
+                                            striped=True,
+                                            animated=True,
+                                            className="mb-2"
+                                        ),
+                                        html.Div(
+                                            id="ingest-progress-text",
+                                            className="text-muted small mb-2"
+                                        ),
+                                        dbc.Button(
+                                            "Cancel",
+                                            id="ingest-cancel-btn",
+                                            color="secondary",
+                                            size="sm",
+                                            outline=True
+                                        ),
+                                    ],
+                                    id="ingest-progress",
+                                    className="text-center mb-4",
+                                    style={"display": "none"}
                                 ),
                                 
                                 # Chat history
@@ -125,8 +163,28 @@ def create_layout():
                                 ]),
                                 
                                 # Hidden components
+                                dcc.Store(id='browser-session', data=browser_session),
                                 dcc.Store(id='vectorstore-state'),
-                                dcc.Store(id='chunk-mapping-state'),
+                                dcc.Store(id='highlight-state'),
+                                dcc.Store(id='viewer-window'),
+                                dcc.Store(id='viewer-page-count'),
+                                dcc.Store(id='visible-page'),
+                                dcc.Store(id='ingest-job'),
+                                dcc.Store(id='highlight-query'),
+                                dcc.Interval(
+                                    id='ingest-poll',
+                                    interval=config.INGESTION_CONFIG['poll_ms'],
+                                    disabled=True
+                                ),
+                                dcc.Interval(
+                                    id='highlight-poll',
+                                    interval=config.VIEWER_CONFIG['highlight_poll_ms'],
+                                    disabled=True
+                                ),
+                                dcc.Interval(
+                                    id='viewer-scroll-poll',
+                                    interval=config.VIEWER_CONFIG['scroll_poll_ms']
+                                ),
                                 html.Div(id="scroll-trigger"),
                                 dcc.Location(id="scroll-location"),
                             ],
@@ -172,8 +230,9 @@ def create_layout():
                                     className="mb-4"
                                 ),
                                 
-                                # Document viewer content
+                                # Document viewer content, pages are filled in on demand
                                 html.Div(
+                                    html.Div(id="document-pages"),
                                     id="document-viewer",
                                     style={
                                         "height": "700px",
@@ -184,6 +243,32 @@ def create_layout():
                                         "background-color": "#f8f9fa"
                                     },
                                 ),
+
+                                # Tables extracted from the document, paged, sorted and filtered server-side
+                                html.Div(
+                                    [
+                                        html.H5("Extracted Tables", className="mt-4 mb-2 text-primary"),
+                                        dcc.Dropdown(id="table-select", clearable=False, className="mb-2"),
+                                        dash_table.DataTable(
+                                            id="table-view",
+                                            columns=[],
+                                            data=[],
+                                            page_current=0,
+                                            page_size=config.VIEWER_CONFIG['table_page_size'],
+                                            page_action='custom',
+                                            sort_action='custom',
+                                            sort_mode='multi',
+                                            sort_by=[],
+                                            filter_action='custom',
+                                            filter_query='',
+                                            style_table={"overflowX": "auto"},
+                                            style_cell={"textAlign": "left", "padding": "8px"},
+                                            style_header={"backgroundColor": "#f8f9fa", "fontWeight": "bold"}
+                                        ),
+                                    ],
+                                    id="table-section",
+                                    style={"display": "none"}
+                                ),
                             ],
                             body=True,
                             style=CARD_STYLE
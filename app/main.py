@@ -2,6 +2,9 @@ from dash import Dash
 import dash_bootstrap_components as dbc
 from app.layout import create_layout
 from app.callbacks import register_callbacks
+from app.uploads import register_upload_routes
+from services.index_janitor import IndexJanitor
+from services.vector_store import INDEX_DIR, catalog
 
 def create_app():
     app = Dash(
@@ -14,8 +17,13 @@ def create_app():
         prevent_initial_callbacks=True
     )
     
-    app.layout = create_layout()
+    # A function, so each page load gets a fresh browser session id
+    app.layout = create_layout
     register_callbacks(app)
+    register_upload_routes(app.server)
+
+    # Evicts old vector indices under the disk quota, off the request path
+    IndexJanitor(INDEX_DIR, catalog).start()
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,83 @@
+"""
+Production entry point: python -m app.serve
+
+Runs create_app() under gunicorn with several worker processes. The app and
+the embedding model are loaded once in the master and shared with the forked
+workers copy-on-write.
+"""
+import gc
+import os
+import sys
+from app import config
+
+# Thread pools are sized when torch/numpy are first imported, so this has to
+# happen before anything pulls in the embedding model.
+THREADS = str(config.SERVER_CONFIG['threads_per_worker'])
+for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS'):
+    os.environ.setdefault(var, THREADS)
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+from gunicorn.app.base import BaseApplication
+from app.main import create_app
+
+
+def warm_up():
+    """Load the embedding model and run it once before the workers fork"""
+    from services.vector_store import embeddings
+    embeddings.embed_query("warm up")
+
+
+def post_fork(server, worker):
+    """Pin each worker's intra-op thread pools to its share of the cores"""
+    # Libraries not loaded yet size their pools from the environment above
+    # when first imported; importing them here would slow every worker's start
+    threads = config.SERVER_CONFIG['threads_per_worker']
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(threads)
+    faiss = sys.modules.get('faiss')
+    if faiss is not None:
+        faiss.omp_set_num_threads(threads)
+
+
+class DocumentQAServer(BaseApplication):
+    def __init__(self, application, options=None):
+        self.application = application
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key.lower(), value)
+
+    def load(self):
+        return self.application
+
+
+def main():
+    app = create_app()
+    # Without the preload the app binds sooner but every worker loads its
+    # own copy of the model on first use
+    if config.SERVER_CONFIG['preload_model']:
+        warm_up()
+
+    # Move everything loaded so far out of the collector's reach so the GC
+    # does not touch (and copy) the shared model pages in every worker
+    gc.freeze()
+
+    options = {
+        'bind': config.SERVER_CONFIG['bind'],
+        'workers': config.SERVER_CONFIG['workers'],
+        'preload_app': True,
+        'max_requests': config.SERVER_CONFIG['max_requests'],
+        'max_requests_jitter': config.SERVER_CONFIG['max_requests_jitter'],
+        'timeout': config.SERVER_CONFIG['timeout'],
+        'graceful_timeout': config.SERVER_CONFIG['graceful_timeout'],
+        'post_fork': post_fork,
+    }
+    DocumentQAServer(app.server, options).run()
+
+
+if __name__ == '__main__':
+    main()
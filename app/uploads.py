@@ -0,0 +1,137 @@
+import fcntl
+import os
+import re
+import time
+from pathlib import Path
+from flask import request, jsonify
+from services.session_store import SessionStore
+from app import config
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.md', '.docx')
+ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+UPLOAD_DIR = Path(config.UPLOAD_CONFIG['dir'])
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def upload_path(upload_id):
+    return UPLOAD_DIR / f"{upload_id}.part"
+
+
+def owner_path(upload_id):
+    return UPLOAD_DIR / f"{upload_id}.owner"
+
+
+def claim_upload(upload_id, session_id):
+    """Record the browser session sending an upload on its first chunk; True if it owns the upload"""
+    try:
+        with open(owner_path(upload_id), "x") as f:
+            f.write(session_id)
+        return True
+    except FileExistsError:
+        with open(owner_path(upload_id), "r") as f:
+            return f.read() == session_id
+
+
+def prune_stale_uploads():
+    """
+    Remove partial uploads that have not received a chunk within the TTL,
+    finished ones no browser submitted within it, and their owner records
+    """
+    now = time.time()
+    for pattern in ("*.part", "*.upload", "*.owner"):
+        for path in UPLOAD_DIR.glob(pattern):
+            try:
+                if now - path.stat().st_mtime > config.UPLOAD_CONFIG['ttl_seconds']:
+                    path.unlink()
+            except OSError:
+                continue
+
+
+def register_upload_routes(server):
+    """
+    Register the streaming upload endpoints on the Flask server.
+
+    Files are sent by app/assets/chunked_upload.js as raw chunks and
+    appended straight to a file on disk, so an upload never exists in
+    memory as a whole (nor as a base64 data URL). An upload can be resumed
+    from the offset reported by GET /upload/<upload_id>.
+    """
+    session_state = SessionStore()
+
+    @server.route("/upload/<upload_id>", methods=["GET"])
+    def upload_offset(upload_id):
+        if not ID_PATTERN.match(upload_id):
+            return jsonify(error="Invalid upload id"), 400
+
+        path = upload_path(upload_id)
+        if not path.exists():
+            prune_stale_uploads()
+        return jsonify(offset=path.stat().st_size if path.exists() else 0)
+
+    @server.route("/upload/<upload_id>", methods=["PUT"])
+    def upload_chunk(upload_id):
+        session_id = request.headers.get("X-Upload-Session", "")
+        if not ID_PATTERN.match(upload_id) or not ID_PATTERN.match(session_id):
+            return jsonify(error="Invalid upload or session id"), 400
+        if not claim_upload(upload_id, session_id):
+            return jsonify(error="Upload belongs to another session"), 403
+
+        offset = request.args.get("offset", type=int)
+        length = request.content_length or 0
+        if offset is None:
+            return jsonify(error="Missing offset"), 400
+        if offset + length > config.MAX_DOC_SIZE:
+            return jsonify(error="File too large (max 50MB)"), 413
+
+        path = upload_path(upload_id)
+        with open(path, "ab") as f:
+            # Serialize writers of the same upload, e.g. a retried request
+            fcntl.flock(f, fcntl.LOCK_EX)
+            current = f.seek(0, os.SEEK_END)
+            if current != offset:
+                return jsonify(offset=current, error="Offset mismatch"), 409
+
+            while True:
+                block = request.stream.read(config.UPLOAD_CONFIG['chunk_size'])
+                if not block:
+                    break
+                f.write(block)
+                if f.tell() > config.MAX_DOC_SIZE:
+                    f.truncate(offset)
+                    return jsonify(error="File too large (max 50MB)"), 413
+            return jsonify(offset=f.tell())
+
+    @server.route("/upload/<upload_id>/complete", methods=["POST"])
+    def upload_complete(upload_id):
+        payload = request.get_json(silent=True) or {}
+        session_id = payload.get("session", "")
+        filename = os.path.basename(payload.get("filename", ""))
+
+        if not ID_PATTERN.match(upload_id) or not ID_PATTERN.match(session_id):
+            return jsonify(error="Invalid upload or session id"), 400
+        if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            return jsonify(error="Unsupported file type"), 415
+
+        path = upload_path(upload_id)
+        if not path.exists():
+            return jsonify(error="Unknown upload"), 404
+        if not claim_upload(upload_id, session_id):
+            return jsonify(error="Upload belongs to another session"), 403
+        size = path.stat().st_size
+        if size != payload.get("size"):
+            return jsonify(offset=size, error="Upload incomplete"), 409
+
+        # Hand the finished file over to the browser session, which submits
+        # it for ingestion in the upload callback
+        final_path = UPLOAD_DIR / f"{upload_id}.upload"
+        os.replace(path, final_path)
+        # The TTL of a finished upload runs from its handover
+        os.utime(final_path)
+        owner_path(upload_id).unlink(missing_ok=True)
+        session_state.put(session_id, "upload", {
+            "path": str(final_path),
+            "filename": filename,
+            "size": size
+        })
+        return jsonify(ok=True)
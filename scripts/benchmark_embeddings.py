@@ -0,0 +1,89 @@
+"""
+Parity check and throughput benchmark of the embedding backends.
+
+Run from the project root:
+    python -m scripts.benchmark_embeddings --texts 2000
+
+Embeds the same texts with the torch backend (HuggingFaceEmbeddings) and the
+ONNX Runtime backend, fp32 and int8-quantized. Reports per-text cosine
+similarity of every ONNX variant against torch and texts/s of each backend;
+exits non-zero when a variant's minimum cosine is below its threshold
+(--min-cosine for fp32, --min-cosine-int8 for the quantized model).
+Needs onnxruntime next to the usual requirements.
+"""
+import argparse
+import random
+import sys
+import time
+import numpy as np
+from app import config
+from services.embeddings import create_embeddings
+
+WORDS = (
+    "revenue quarter report growth cost margin customer contract invoice payment policy "
+    "model training data pipeline latency throughput memory index query answer document "
+    "section table figure result analysis risk compliance audit review summary"
+).split()
+
+
+def sample_texts(count: int, seed: int = 0):
+    """Chunk-like texts from 5 to ~120 words, like ingestion and query inputs"""
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(5, 120))) for _ in range(count)]
+
+
+def embed(embeddings, texts, batch_size):
+    # Warm up outside the timing (model load, ONNX export/quantization, session start)
+    embeddings.embed_documents(texts[:batch_size])
+    started = time.perf_counter()
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+    elapsed = time.perf_counter() - started
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True), len(texts) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=config.INGESTION_CONFIG['embed_batch_size'])
+    parser.add_argument("--min-cosine", type=float, default=0.999)
+    parser.add_argument("--min-cosine-int8", type=float, default=0.97)
+    args = parser.parse_args()
+
+    # Same thread budget for both runtimes
+    import torch
+    torch.set_num_threads(config.EMBEDDINGS_MODEL['intra_op_threads'])
+
+    texts = sample_texts(args.texts)
+    variants = {
+        "torch": (dict(config.EMBEDDINGS_MODEL, backend="torch"), None),
+        "onnx fp32": (dict(config.EMBEDDINGS_MODEL, backend="onnx", quantize=False), args.min_cosine),
+        "onnx int8": (dict(config.EMBEDDINGS_MODEL, backend="onnx", quantize=True), args.min_cosine_int8),
+    }
+
+    reference = None
+    failed = False
+    print(f"{len(texts)} texts, batch size {args.batch_size}, "
+          f"{config.EMBEDDINGS_MODEL['intra_op_threads']} intra-op threads")
+    for name, (embeddings_config, min_cosine) in variants.items():
+        vectors, throughput = embed(create_embeddings(embeddings_config), texts, args.batch_size)
+        if reference is None:
+            reference = vectors
+            print(f"{name:>10}: {throughput:8.1f} texts/s")
+            continue
+
+        cosine = np.sum(vectors * reference, axis=1)
+        passed = cosine.min() >= min_cosine
+        failed = failed or not passed
+        print(f"{name:>10}: {throughput:8.1f} texts/s  cosine vs torch "
+              f"min {cosine.min():.4f} mean {cosine.mean():.4f}  {'ok' if passed else f'below {min_cosine}'}")
+
+    if failed:
+        print("Parity check failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Import-time report and cold-start budget check of the app.
+
+Run from the project root:
+    python -m scripts.import_report --budget 5
+
+Starts a fresh interpreter that imports app.main with -X importtime and
+reports the slowest packages (self time summed per top-level package) and
+the slowest imports of the app's own modules (cumulative).
+
+Then a second fresh interpreter builds the app and serves its first page
+through the Flask test client: the index page and the layout the browser
+fetches right after it. The check fails (non-zero exit) when that takes
+longer than --budget seconds, measured from process start, or when one of
+the heavy libraries that should only load on first use (model, index,
+PDF/DOCX extraction, LLM client) was imported on the way.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# Seconds from process start to the first page served
+BUDGET_SECONDS = 5.0
+
+# Loaded on first use (upload, query, highlight), never to serve the first page
+DEFERRED_MODULES = (
+    "torch", "transformers", "sentence_transformers", "onnxruntime",
+    "langchain", "langchain_core", "langchain_community", "langchain_huggingface",
+    "faiss", "openai", "fitz", "PyPDF2", "camelot", "docx", "pandas", "boto3",
+)
+
+FIRST_PAGE = """
+import json, sys, time
+started = time.perf_counter()
+from app.main import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.server.test_client()
+index = client.get("/")
+layout = client.get("/_dash-layout")
+served = time.perf_counter()
+print(json.dumps({
+    "status": [index.status_code, layout.status_code],
+    "import": imported - started,
+    "create_app": created - imported,
+    "first_page": served - created,
+    "loaded": sorted(name for name in %r if name in sys.modules),
+}))
+"""
+
+
+def root_dir():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module):
+    """(module, self us, cumulative us) of every import made by importing `module` in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root_dir(), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def report(rows, top):
+    packages = defaultdict(int)
+    for name, self_us, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    total = sum(packages.values())
+    print(f"Importing app.main: {total / 1e6:.2f}s, {len(rows)} modules")
+
+    print("\nSlowest packages (self time):")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {self_us / 1e6:7.3f}s  {package}")
+
+    print("\nSlowest app modules (cumulative):")
+    own = [row for row in rows if row[0].split(".")[0] in ("app", "services", "utils")]
+    for name, _, cumulative_us in sorted(own, key=lambda row: -row[2])[:top]:
+        print(f"  {cumulative_us / 1e6:7.3f}s  {name}")
+
+
+def first_page():
+    """Serve the first page from a cold interpreter; returns (wall seconds, child timings)"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_PAGE % (DEFERRED_MODULES,)],
+        cwd=root_dir(), capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        sys.exit(f"Serving the first page failed:\n{result.stderr[-2000:]}")
+    return elapsed, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS, help="seconds to serve the first page")
+    parser.add_argument("--top", type=int, default=15, help="rows per report table")
+    args = parser.parse_args()
+
+    report(import_times("app.main"), args.top)
+
+    elapsed, timings = first_page()
+    print(f"\nFirst page: {elapsed:.2f}s from process start (import {timings['import']:.2f}s, "
+          f"create_app {timings['create_app']:.2f}s, requests {timings['first_page']:.2f}s), "
+          f"status {timings['status']}")
+
+    failed = False
+    if timings["loaded"]:
+        failed = True
+        print(f"Loaded before first use: {', '.join(timings['loaded'])}")
+    if any(status != 200 for status in timings["status"]):
+        failed = True
+        print("First page not served")
+    if elapsed > args.budget:
+        failed = True
+        print(f"Over the cold-start budget of {args.budget:.1f}s")
+
+    if failed:
+        sys.exit(1)
+    print(f"Within the cold-start budget of {args.budget:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
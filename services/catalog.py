@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used);
+
+CREATE TABLE IF NOT EXISTS documents (
+    session_id TEXT PRIMARY KEY REFERENCES sessions (session_id) ON DELETE CASCADE,
+    filename TEXT,
+    pages_indexed INTEGER NOT NULL DEFAULT 0,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS chunks (
+    session_id TEXT NOT NULL REFERENCES sessions (session_id) ON DELETE CASCADE,
+    row INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL UNIQUE,
+    page INTEGER,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    PRIMARY KEY (session_id, row)
+);
+"""
+
+
+class IndexCatalog:
+    """
+    SQLite catalog of the indexed sessions, their document and its chunks.
+
+    Replaces the per-session metadata.json and the whole-docstore data.json:
+    a chunk row is keyed by (session, FAISS row) and by chunk id, so a query
+    fetches just its k hits. The database runs in WAL mode, so ingestion
+    processes write while web workers read; every thread of every process
+    uses its own connection.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not cross threads, nor a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def create_session(self, session_id: str, filename: Optional[str] = None) -> None:
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute(
+                "INSERT INTO sessions (session_id, created, last_used) VALUES (?, ?, ?)",
+                (session_id, now, now)
+            )
+            conn.execute("INSERT INTO documents (session_id, filename) VALUES (?, ?)", (session_id, filename))
+
+    def add_chunks(self, session_id: str, first_row: int, chunks: Iterable["Document"]) -> None:
+        """Insert chunks in FAISS row order, starting at `first_row`"""
+        rows = [
+            (session_id, first_row + offset, doc.metadata["chunk_id"], doc.metadata.get("page"),
+             doc.page_content, json.dumps(doc.metadata))
+            for offset, doc in enumerate(chunks)
+        ]
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO chunks (session_id, row, chunk_id, page, content, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def update_document(self, session_id: str, pages_indexed: int, chunk_count: int, complete: bool) -> None:
+        self._connect().execute(
+            "UPDATE documents SET pages_indexed = ?, chunk_count = ?, complete = ? WHERE session_id = ?",
+            (pages_indexed, chunk_count, int(complete), session_id)
+        )
+
+    def touch(self, session_id: str) -> Optional[dict]:
+        """Mark a session as used now and return its record, None if unknown"""
+        conn = self._connect()
+        updated = conn.execute(
+            "UPDATE sessions SET last_used = ? WHERE session_id = ?", (time.time(), session_id)
+        ).rowcount
+        if not updated:
+            return None
+        row = conn.execute(
+            "SELECT s.created, s.last_used, d.filename, d.pages_indexed, d.chunk_count, d.complete "
+            "FROM sessions s LEFT JOIN documents d USING (session_id) WHERE s.session_id = ?",
+            (session_id,)
+        ).fetchone()
+        keys = ("created", "last_used", "filename", "pages_indexed", "chunk_count", "complete")
+        return dict(zip(keys, row)) if row else None
+
+    def fetch_rows(self, session_id: str, rows: List[int]) -> Dict[int, "Document"]:
+        """Fetch the chunks stored at the given FAISS rows"""
+        from langchain.schema import Document
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        result = self._connect().execute(
+            f"SELECT row, content, metadata FROM chunks WHERE session_id = ? AND row IN ({placeholders})",
+            (session_id, *rows)
+        )
+        return {
+            row: Document(page_content=content, metadata=json.loads(metadata))
+            for row, content, metadata in result
+        }
+
+    def fetch_chunks(self, session_id: str, chunk_ids: List[str]) -> Dict[str, str]:
+        """Return {chunk_id: text} for the given chunk ids of a session (ids of other sessions are skipped)"""
+        if not chunk_ids:
+            return {}
+        placeholders = ",".join("?" * len(chunk_ids))
+        result = self._connect().execute(
+            f"SELECT chunk_id, content FROM chunks WHERE session_id = ? AND chunk_id IN ({placeholders})",
+            (session_id, *chunk_ids)
+        )
+        return dict(result.fetchall())
+
+    def export_session(self, session_id: str) -> dict:
+        """Return the document and chunk rows of a session as plain data"""
+        conn = self._connect()
+        document = conn.execute(
+            "SELECT filename, pages_indexed, chunk_count, complete FROM documents WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        chunks = conn.execute(
+            "SELECT row, chunk_id, page, content, metadata FROM chunks WHERE session_id = ? ORDER BY row",
+            (session_id,)
+        ).fetchall()
+        return {"document": list(document) if document else None, "chunks": [list(chunk) for chunk in chunks]}
+
+    def import_session(self, session_id: str, data: dict) -> None:
+        """Replace a session with exported data, e.g. a bundle fetched from another node"""
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute(
+                "INSERT INTO sessions (session_id, created, last_used) VALUES (?, ?, ?)",
+                (session_id, now, now)
+            )
+            if data["document"]:
+                conn.execute(
+                    "INSERT INTO documents (session_id, filename, pages_indexed, chunk_count, complete) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (session_id, *data["document"])
+                )
+            conn.executemany(
+                "INSERT INTO chunks (session_id, row, chunk_id, page, content, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                [(session_id, *chunk) for chunk in data["chunks"]]
+            )
+
+    def sessions(self) -> Dict[str, float]:
+        """Return {session_id: last_used} of every session"""
+        return dict(self._connect().execute("SELECT session_id, last_used FROM sessions").fetchall())
+
+    def delete_session(self, session_id: str) -> None:
+        """Remove a session with its document and chunks"""
+        self._connect().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+class CatalogDocstore:
+    """Docstore of one session that fetches chunks from the catalog on demand"""
+
+    def __init__(self, catalog: IndexCatalog, session_id: str):
+        self.catalog = catalog
+        self.session_id = session_id
+
+    def fetch_rows(self, rows: List[int]) -> Dict[int, "Document"]:
+        return self.catalog.fetch_rows(self.session_id, rows)
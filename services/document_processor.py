@@ -1,110 +1,120 @@
-from typing import Tuple, List, Optional, Dict, Any
+from typing import TYPE_CHECKING, Tuple, List, Optional, Dict, Callable, Union, Iterator
+import importlib.util
+import os
 import base64
 import io
-import fitz
-import docx2txt
-import PyPDF2
-import pandas as pd
-import camelot
 from pathlib import Path
-from PIL import Image
+from utils.page_layout import PageLayout
+from utils.text_helpers import TextProcessor
 
-try:
-    import camelot
-    CAMELOT_AVAILABLE = True
-except ImportError:
-    CAMELOT_AVAILABLE = False
+# The PDF, DOCX and table libraries are imported where they are used, so
+# importing the app does not pay for them before the first upload
+if TYPE_CHECKING:
+    import fitz
+    import pandas as pd
+    from services.docx_extractor import DocxExtractor
+
+CAMELOT_AVAILABLE = importlib.util.find_spec("camelot") is not None
+
+# PDFs are read either from memory or, for streamed uploads, straight from disk
+PdfSource = Union[bytes, str, Path]
+
+def _open_pdf(source: PdfSource) -> "fitz.Document":
+    """Open a PDF from bytes or from a path (MuPDF then reads pages from the file lazily)"""
+    import fitz
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(str(source))
+
+def _as_file(source: PdfSource) -> Union[io.BytesIO, str]:
+    """Return something file-like or a path string for libraries that take either"""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return str(source)
 
 class DocumentProcessor:
+    TEXT_PIECE_SIZE = 64 * 1024  # characters per streamed piece of a text document
+    DOCX_LINES_PER_PAGE = 40  # lines (paragraphs, table rows) per virtual DOCX page
+
     def __init__(self, max_doc_size: int = 50 * 1024 * 1024):
         self.max_doc_size = max_doc_size
         
-    def process_document(self, contents: str, filename: str) -> Tuple[Any, List[dict], List[pd.DataFrame], Optional[str]]:
+    def _iter_docx_pages(self, extractor: "DocxExtractor", on_page: Optional[Callable[[int, int], None]] = None) -> Iterator[PageLayout]:
+        """Yield the virtual pages of a DOCX document, reporting progress against an estimate"""
+        page_estimate = extractor.page_estimate()
+        page_num = 0
+        for page_num, page_layout in enumerate(extractor.iter_pages(), 1):
+            yield page_layout
+            if on_page:
+                on_page(page_num, max(page_num, page_estimate))
+        if on_page:
+            on_page(page_num, page_num)
+    
+    def iter_text_pages(self, path: Union[str, Path], filename: str, on_page: Optional[Callable[[int, int], None]] = None, assets: Optional[Dict[str, list]] = None) -> Iterator[Tuple[Optional[PageLayout], str]]:
         """
-        Process uploaded document and extract content, images, and tables
-        
-        Returns:
-        Tuple[Any, List[dict], List[pd.DataFrame], Optional[str]]: 
-            - Processed content
-            - List of extracted images
-            - List of extracted tables
-            - Plain text version for vectorization
+        Yield the document page by page as soon as each page is extracted.
+
+        Args:
+            assets: Optional dict receiving the "images" and "tables" of
+                formats extracted in the same pass (DOCX)
+
+        Yields:
+            Tuple[Optional[PageLayout], str]:
+                - Layout of the page (PDF and DOCX, None for text documents)
+                - Text of the page; joined together the texts form the plain
+                  text used for vectorization
         """
-        try:
-            content_type, content_string = contents.split(",")
-            decoded = base64.b64decode(content_string)
-            
-            if len(decoded) > self.max_doc_size:
-                raise ValueError("File too large (max 50MB)")
-            
-            if filename.lower().endswith('.pdf'):
-                return self._process_pdf(decoded)
-            elif filename.lower().endswith(('.txt', '.md')):
-                content = decoded.decode("utf-8")
-                return content, [], [], content
-            elif filename.lower().endswith('.docx'):
-                content = docx2txt.process(io.BytesIO(decoded))
-                return content, [], [], content
-            else:
-                raise ValueError("Unsupported file type")
-                
-        except Exception as e:
-            raise Exception(f"Error processing file: {str(e)}")
+        if os.path.getsize(path) > self.max_doc_size:
+            raise ValueError("File too large (max 50MB)")
 
-    def _process_pdf(self, pdf_bytes: bytes) -> Tuple[List[List[dict]], List[dict], List[pd.DataFrame], str]:
-        """Process PDF file and extract content, images, and tables"""
-        content = self._extract_text_with_layout(pdf_bytes)
-        images = self._extract_images(pdf_bytes)
-        tables = self._extract_tables(pdf_bytes)
-        
-        # Create plain text version for vectorstore
-        plain_text = "\n".join(
-            " ".join(span["text"] for spans in page for span in spans)
-            for page in content
-        )
-        
-        return content, images, tables, plain_text
-    
-    def _extract_text_with_layout(self, pdf_bytes: bytes) -> List[List[dict]]:
-        """Extract text from PDF while preserving layout"""
-        try:
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            pages_content = []
-            
-            for page in doc:
-                blocks = page.get_text("dict", sort=True)["blocks"]
-                page_text = []
-                
-                for block in blocks:
-                    if "lines" in block:
-                        for line in block["lines"]:
-                            if "spans" in line:
-                                spans_text = []
-                                for span in line["spans"]:
-                                    if span["text"].strip():
-                                        spans_text.append({
-                                            "text": span["text"],
-                                            "font_size": span["size"],
-                                            "is_bold": "bold" in span["font"].lower(),
-                                            "is_italic": "italic" in span["font"].lower(),
-                                            "bbox": span["bbox"]
-                                        })
-                                
-                                if spans_text:
-                                    page_text.append(spans_text)
-                
-                pages_content.append(page_text)
-                
-            return pages_content
-            
-        except Exception as e:
-            raise Exception(f"Error in PDF text extraction: {e}")
-    
-    def _extract_images(self, pdf_bytes: bytes) -> List[dict]:
+        if filename.lower().endswith('.pdf'):
+            for page_num, page_count, page_layout in self._iter_layout_pages(path):
+                yield page_layout, page_layout.plain_text() + "\n"
+                if on_page:
+                    on_page(page_num + 1, page_count)
+            return
+
+        if filename.lower().endswith('.docx'):
+            from services.docx_extractor import DocxExtractor
+            extractor = DocxExtractor(path, self.DOCX_LINES_PER_PAGE)
+            for page_layout in self._iter_docx_pages(extractor, on_page):
+                yield page_layout, page_layout.plain_text() + "\n"
+            if assets is not None:
+                assets.update(images=extractor.images, tables=extractor.tables)
+            return
+
+        if filename.lower().endswith(('.txt', '.md')):
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+        else:
+            raise ValueError("Unsupported file type")
+
+        # Text documents are fed downstream in pieces cut between sections
+        piece_count = len(content) // self.TEXT_PIECE_SIZE + 1
+        for piece_num, piece in enumerate(TextProcessor.iter_pieces(content, self.TEXT_PIECE_SIZE), 1):
+            yield None, piece
+            if on_page:
+                on_page(min(piece_num, piece_count), piece_count)
+
+    def _iter_layout_pages(self, pdf_source: PdfSource) -> Iterator[Tuple[int, int, PageLayout]]:
+        """Yield (page_num, page_count, columnar span layout) for every PDF page"""
+        doc = _open_pdf(pdf_source)
+
+        for page_num, page in enumerate(doc):
+            blocks = page.get_text("dict", sort=True)["blocks"]
+            spans = (
+                span
+                for block in blocks
+                for line in block.get("lines", [])
+                for span in line.get("spans", [])
+            )
+            yield page_num, len(doc), PageLayout.from_spans(spans)
+
+    def _extract_images(self, pdf_source: PdfSource) -> List[dict]:
         """Extract images from PDF"""
         images = []
         try:
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+            doc = _open_pdf(pdf_source)
             
             for page_num in range(len(doc)):
                 page = doc[page_num]
@@ -135,20 +145,21 @@ class DocumentProcessor:
         except Exception as e:
             raise Exception(f"Error extracting images: {str(e)}")
     
-    def _extract_tables(self, pdf_bytes: bytes) -> List[pd.DataFrame]:
+    def _extract_tables(self, pdf_source: PdfSource) -> List["pd.DataFrame"]:
         """Extract tables from PDF"""
         try:
             if CAMELOT_AVAILABLE:
-                return self._extract_tables_camelot(pdf_bytes)
+                return self._extract_tables_camelot(pdf_source)
             else:
-                return self._extract_tables_basic(pdf_bytes)
+                return self._extract_tables_basic(pdf_source)
                 
         except Exception as e:
             raise Exception(f"Error extracting tables: {str(e)}")
     
-    def _extract_tables_camelot(self, pdf_bytes: bytes) -> List[pd.DataFrame]:
+    def _extract_tables_camelot(self, pdf_source: PdfSource) -> List["pd.DataFrame"]:
         """Extract tables using Camelot library"""
-        pdf_buffer = io.BytesIO(pdf_bytes)
+        import camelot
+        pdf_buffer = _as_file(pdf_source)
         tables = camelot.read_pdf(pdf_buffer, pages='all', flavor='stream')
         extracted_tables = []
         
@@ -167,9 +178,11 @@ class DocumentProcessor:
         
         return extracted_tables
     
-    def _extract_tables_basic(self, pdf_bytes: bytes) -> List[pd.DataFrame]:
+    def _extract_tables_basic(self, pdf_source: PdfSource) -> List["pd.DataFrame"]:
         """Basic table extraction when Camelot is not available"""
-        pdf_file = io.BytesIO(pdf_bytes)
+        import pandas as pd
+        import PyPDF2
+        pdf_file = _as_file(pdf_source)
         reader = PyPDF2.PdfReader(pdf_file)
         
         tables = []
@@ -0,0 +1,187 @@
+import base64
+from typing import BinaryIO, Iterator, List, Optional, Union
+from pathlib import Path
+import docx
+import pandas as pd
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.hyperlink import Hyperlink
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+from utils.page_layout import LINE_GAP, PageLayout
+
+# Font sizes (pt) of headings by level, 0 being the Title style
+HEADING_SIZES = {0: 24, 1: 22, 2: 20, 3: 18}
+MIN_HEADING_SIZE = 16
+BODY_SIZE = 12
+
+
+class DocxExtractor:
+    """
+    Single pass extraction of a DOCX document.
+
+    Walks the body once in document order and turns it into the same
+    columnar PageLayout pages as the PDF path: every paragraph (and every
+    table row) becomes one line. Consecutive runs of the same style form one
+    span and the spans of a line are joined without separator, Word splits
+    runs anywhere, even inside words. Headings are sized by level. Tables
+    are collected as DataFrames and inline images as the same dicts the PDF
+    image extraction produces, both on the way.
+
+    DOCX has no fixed pages, so a virtual page ends at an explicit page break
+    (also one inside a paragraph) or after `lines_per_page` lines.
+    """
+
+    def __init__(self, source: Union[str, Path, BinaryIO], lines_per_page: int = 40):
+        self.document = docx.Document(source if not isinstance(source, Path) else str(source))
+        self.lines_per_page = lines_per_page
+        self.images: List[dict] = []
+        self.tables: List[pd.DataFrame] = []
+        self._spans = []
+        self._line_count = 0
+        self._page_num = 0
+
+    def page_estimate(self) -> int:
+        """Rough page count from the body's paragraphs and table rows, for progress reporting"""
+        body = self.document.element.body
+        lines = len(body.xpath("./w:p")) + len(body.xpath("./w:tbl/w:tr"))
+        return max(1, -(-lines // self.lines_per_page))
+
+    def iter_pages(self) -> Iterator[PageLayout]:
+        """Yield the layout of every virtual page, filling `images` and `tables` along the way"""
+        self.images = []
+        self.tables = []
+        self._spans = []
+        self._line_count = 0
+        self._page_num = 0
+
+        for item in self.document.iter_inner_content():
+            if isinstance(item, Paragraph):
+                yield from self._add_paragraph(item)
+            elif isinstance(item, Table):
+                self._add_table(item)
+            else:
+                continue
+            if self._line_count >= self.lines_per_page:
+                yield self._flush()
+
+        if self._spans:
+            yield self._flush()
+
+    def _flush(self) -> PageLayout:
+        page = PageLayout.from_spans(self._spans, span_separator="")
+        self._spans = []
+        self._line_count = 0
+        self._page_num += 1
+        return page
+
+    def _add_line(self, spans: List[tuple]) -> None:
+        """Append one line of (text, size, bold, italic) spans to the current page"""
+        # Runs of the same style are merged and whitespace-only runs kept with
+        # the text before them, so no space inside the line gets lost
+        merged = []
+        for text, size, bold, italic in spans:
+            if merged and (tuple(merged[-1][1:]) == (size, bold, italic) or not text.strip()):
+                merged[-1][0] += text
+            elif text.strip() or merged:
+                merged.append([text, size, bold, italic])
+        if not any(text.strip() for text, _, _, _ in merged):
+            return
+
+        # Lines sit 2 * LINE_GAP apart, so PageLayout groups every line on its own
+        y = self._line_count * 2 * LINE_GAP
+        for text, size, bold, italic in merged:
+            self._spans.append({
+                "text": text,
+                "size": size,
+                "font": ("Bold" if bold else "") + ("Italic" if italic else ""),
+                "bbox": (0, y, 0, y + size)
+            })
+        self._line_count += 1
+
+    def _heading_level(self, paragraph: Paragraph) -> Optional[int]:
+        name = paragraph.style.name if paragraph.style is not None else ""
+        if name == "Title":
+            return 0
+        if name.startswith("Heading"):
+            level = name[len("Heading"):].strip()
+            return int(level) if level.isdigit() else 1
+        return None
+
+    @staticmethod
+    def _run_pieces(run: Run) -> List[str]:
+        """Text of a run, split where it holds a page break"""
+        pieces = [""]
+        for child in run._r:
+            if child.tag == qn("w:t"):
+                pieces[-1] += child.text or ""
+            elif child.tag == qn("w:tab"):
+                pieces[-1] += "\t"
+            elif child.tag == qn("w:br"):
+                if child.get(qn("w:type")) == "page":
+                    pieces.append("")
+                else:
+                    pieces[-1] += "\n"
+            elif child.tag == qn("w:cr"):
+                pieces[-1] += "\n"
+        return pieces
+
+    def _add_paragraph(self, paragraph: Paragraph) -> Iterator[PageLayout]:
+        """Add a paragraph and its inline images, yielding the page a page break inside it ends"""
+        level = self._heading_level(paragraph)
+        spans = []
+        for item in paragraph.iter_inner_content():
+            # Hyperlink text is part of the paragraph too
+            for run in (item.runs if isinstance(item, Hyperlink) else [item]):
+                if level is not None:
+                    size = HEADING_SIZES.get(level, MIN_HEADING_SIZE)
+                else:
+                    size = run.font.size.pt if run.font.size is not None else BODY_SIZE
+                style = (size, bool(run.bold) or level is not None, bool(run.italic))
+                for index, piece in enumerate(self._run_pieces(run)):
+                    if index > 0:
+                        # Text after the break starts the next page
+                        self._add_line(spans)
+                        spans = []
+                        yield self._flush()
+                    spans.append((piece, *style))
+
+        self._add_line(spans)
+
+        for rel_id in paragraph._element.xpath(".//a:blip/@r:embed"):
+            self._add_image(rel_id)
+
+    def _add_table(self, table: Table) -> None:
+        """Add a table as one line per row and collect it as a DataFrame"""
+        rows = []
+        # Merged cells are repeated at every grid position they span; they
+        # are kept once, at their first position
+        seen = set()
+        for row in table.rows:
+            cells = []
+            for cell in row.cells:
+                cells.append("" if cell._tc in seen else cell.text.strip())
+                seen.add(cell._tc)
+            rows.append(cells)
+            self._add_line([(" ".join(cell for cell in cells if cell), BODY_SIZE, False, False)])
+
+        if rows:
+            width = max(len(cells) for cells in rows)
+            df = pd.DataFrame([cells + [""] * (width - len(cells)) for cells in rows])
+            df.columns = [f"Column {i+1}" for i in range(width)]
+            if not df.empty:
+                self.tables.append(df)
+
+    def _add_image(self, rel_id: str) -> None:
+        try:
+            image_part = self.document.part.related_parts[rel_id]
+            image_bytes = image_part.blob
+            image_format = image_part.content_type.split("/")[-1]
+            self.images.append({
+                'data': f"data:image/{image_format};base64,{base64.b64encode(image_bytes).decode('utf-8')}",
+                'page': self._page_num,
+                'format': image_format,
+                'size': len(image_bytes)
+            })
+        except Exception as e:
+            print(f"Error extracting DOCX image {rel_id}: {str(e)}")
@@ -0,0 +1,263 @@
+import collections
+import itertools
+import multiprocessing
+import multiprocessing.util
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Iterable, Iterator, List, Tuple
+import numpy as np
+
+
+def _worker_main(model, slots, tasks, results, owner_pid):
+    """Embed batches until told to stop, writing the vectors into the slot each task names"""
+    # Forked from a process that already ran torch with other threads alive:
+    # a multi-threaded intra-op pool can deadlock in the child, one thread cannot
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(1)
+
+    while True:
+        try:
+            task = tasks.get(timeout=1)
+        except queue.Empty:
+            # An owner leaving through os._exit never sends the stop sentinel
+            if os.getppid() != owner_pid:
+                return
+            continue
+        if task is None:
+            return
+        task_id, slot_index, texts = task
+        try:
+            vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+            out = np.ndarray(vectors.shape, dtype=np.float32, buffer=slots[slot_index].buf)
+            out[:] = vectors
+            results.put((task_id, len(vectors), None))
+        except Exception as e:
+            results.put((task_id, 0, f"{type(e).__name__}: {str(e)}"))
+
+
+class _Workers:
+    """The worker processes, shared memory slots and queues of one started pool"""
+
+    def __init__(self, model, workers: int, slot_count: int, slot_bytes: int, start_method: str):
+        context = multiprocessing.get_context(start_method)
+        self.pid = os.getpid()
+        self.slots = [SharedMemory(create=True, size=slot_bytes) for _ in range(slot_count)]
+        self.free_slots = queue.Queue()
+        for slot_index in range(slot_count):
+            self.free_slots.put(slot_index)
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.pending = {}
+        self.task_ids = itertools.count()
+        self.broken = False
+        self.closed = False
+        self.lock = threading.Lock()
+        # Forked after the slots exist, so every worker inherits their mappings
+        self.processes = [
+            context.Process(
+                target=_worker_main,
+                args=(model, self.slots, self.tasks, self.results, self.pid),
+                name=f"embedding-worker-{index}",
+                daemon=True
+            )
+            for index in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        # Runs before multiprocessing terminates daemonic children, in pool processes too
+        multiprocessing.util.Finalize(self, self.shutdown, exitpriority=10)
+
+    def shutdown(self) -> None:
+        # Processes forked without multiprocessing inherit this finalizer, only the owner may run it
+        if os.getpid() != self.pid or self.closed:
+            return
+        self.closed = True
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for slot in self.slots:
+            slot.close()
+            slot.unlink()
+
+
+class EmbeddingPool:
+    """
+    Embedding model sharded across a pool of worker processes.
+
+    Workers are forked from the process using the pool, so each holds the
+    model loaded once (shared copy-on-write with the parent) and runs it on
+    one thread, the only safe torch setting after a fork; the pool scales
+    with `workers` instead. Batches of at most `max_batch` texts go to the
+    workers through a queue. Vectors come back through preallocated shared
+    memory slots: the worker writes them into the slot of its task and only
+    the row count travels through the result queue. With every slot in use,
+    submitting blocks, which bounds the queue.
+
+    Workers start on first use, separately in every process (web workers and
+    ingestion processes each get their own pool), and again after a worker
+    died. Exposes embed_documents/embed_query like the model itself, so it
+    can stand in for it, and stats() for queue depth and throughput.
+    """
+
+    # Window over which stats() measures throughput
+    RATE_WINDOW_SECONDS = 10
+
+    def __init__(self, model, workers: int, max_batch: int = 32, slots_per_worker: int = 2,
+                 start_method: str = "fork"):
+        self.model = model
+        self.workers = workers
+        self.max_batch = max_batch
+        self.slots_per_worker = slots_per_worker
+        self.start_method = start_method
+        self.dim = None
+        self._state = None
+        self._lock = threading.Lock()
+        self._completed = collections.deque()
+        self._texts_done = 0
+        # A fork may happen while a thread holds the lock
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    def _started(self) -> _Workers:
+        state = self._state
+        if state is not None and state.pid == os.getpid() and not state.broken:
+            return state
+        with self._lock:
+            state = self._state
+            # Forked children inherit the parent's pool object, never its workers
+            if state is None or state.pid != os.getpid() or state.broken:
+                if self.dim is None:
+                    self.dim = len(self.model.embed_query("dimension probe"))
+                state = _Workers(
+                    self.model,
+                    self.workers,
+                    self.workers * self.slots_per_worker,
+                    self.max_batch * self.dim * 4,
+                    self.start_method
+                )
+                threading.Thread(target=self._collect, args=(state,), name="embedding-results", daemon=True).start()
+                self._state = state
+                self._completed.clear()
+            return state
+
+    def _collect(self, state: _Workers) -> None:
+        """Resolve the futures of finished batches (runs in a thread of the owning process)"""
+        while True:
+            try:
+                task_id, rows, error = state.results.get(timeout=1)
+            except queue.Empty:
+                if not all(process.is_alive() for process in state.processes):
+                    self._fail(state, "embedding worker died")
+                    return
+                continue
+
+            with state.lock:
+                future, slot_index = state.pending.pop(task_id)
+            if error is None:
+                vectors = np.ndarray((rows, self.dim), dtype=np.float32, buffer=state.slots[slot_index].buf).copy()
+            state.free_slots.put(slot_index)
+
+            if error is not None:
+                future.set_exception(RuntimeError(f"Error embedding batch: {error}"))
+                continue
+            with self._lock:
+                self._texts_done += rows
+                self._completed.append((time.monotonic(), rows))
+            future.set_result(vectors)
+
+    def _fail(self, state: _Workers, reason: str) -> None:
+        # Marking the state broken makes the next submit start a fresh pool
+        with state.lock:
+            state.broken = True
+            pending, state.pending = state.pending, {}
+        for future, _ in pending.values():
+            future.set_exception(RuntimeError(f"Error embedding batch: {reason}"))
+        # Wake submitters waiting for a slot, they see the broken state
+        for _ in range(len(state.slots)):
+            state.free_slots.put(None)
+        state.shutdown()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue one batch of at most `max_batch` texts; the future resolves to a (n, dim) float32 array"""
+        if len(texts) > self.max_batch:
+            raise ValueError(f"Batch of {len(texts)} texts exceeds max_batch={self.max_batch}")
+        state = self._started()
+        slot_index = state.free_slots.get()
+        future = Future()
+        with state.lock:
+            if state.broken:
+                raise RuntimeError("Error embedding batch: embedding worker died")
+            task_id = next(state.task_ids)
+            state.pending[task_id] = (future, slot_index)
+        state.tasks.put((task_id, slot_index, list(texts)))
+        return future
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, sharded into batches across the workers; rows in input order"""
+        futures = [
+            self.submit(texts[start:start + self.max_batch])
+            for start in range(0, len(texts), self.max_batch)
+        ]
+        if not futures:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.concatenate([future.result() for future in futures])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.submit([text]).result()[0]
+
+    def imap(self, items: Iterable, texts_of: Callable) -> Iterator[Tuple[object, np.ndarray]]:
+        """
+        Yield (item, vectors) for batches of texts, in order, keeping every
+        slot busy: up to one batch per slot is submitted ahead of the one
+        being waited for
+        """
+        in_flight = collections.deque()
+        for item in items:
+            in_flight.append((item, self.submit(texts_of(item))))
+            if len(in_flight) >= self.workers * self.slots_per_worker:
+                item, future = in_flight.popleft()
+                yield item, future.result()
+        while in_flight:
+            item, future = in_flight.popleft()
+            yield item, future.result()
+
+    def stats(self) -> dict:
+        """Queue depth (batches submitted but not finished) and recent throughput"""
+        state = self._state
+        queue_depth = len(state.pending) if state is not None and state.pid == os.getpid() else 0
+        now = time.monotonic()
+        with self._lock:
+            while self._completed and now - self._completed[0][0] > self.RATE_WINDOW_SECONDS:
+                self._completed.popleft()
+            recent = sum(rows for _, rows in self._completed)
+            span = now - self._completed[0][0] if self._completed else 0
+            return {
+                "workers": self.workers,
+                "queue_depth": queue_depth,
+                "texts_done": self._texts_done,
+                "texts_per_second": recent / max(span, 1.0)
+            }
+
+
+def embed_batches(embeddings, items: Iterable, texts_of: Callable) -> Iterator[Tuple[object, list]]:
+    """
+    Yield (item, vectors) for every batch of `items`, in order. A pool gets
+    its batches submitted ahead so all workers stay busy; a plain model
+    embeds them one after the other.
+    """
+    if isinstance(embeddings, EmbeddingPool):
+        yield from embeddings.imap(items, texts_of)
+        return
+    for item in items:
+        yield item, embeddings.embed_documents(texts_of(item))
@@ -0,0 +1,199 @@
+import fcntl
+import importlib.util
+import inspect
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import List
+import numpy as np
+
+# onnxruntime and transformers take seconds to import, they are only
+# imported once a model is actually loaded
+ONNX_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("onnxruntime", "transformers"))
+
+
+class OnnxEmbeddings:
+    """
+    Sentence-transformers model (mean pooling + L2 normalization, as
+    all-MiniLM-L6-v2 is configured) run through ONNX Runtime on CPU.
+
+    The model is exported to ONNX on first use, and optionally quantized to
+    int8 with dynamic quantization, into `model_dir`; later processes reuse
+    the files. Exposes embed_documents/embed_query like the LangChain
+    embeddings it replaces.
+    """
+
+    def __init__(self, model_name: str, model_dir: Path, quantize: bool = False, intra_op_threads: int = 1,
+                 max_length: int = 256, batch_size: int = 32):
+        if not ONNX_AVAILABLE:
+            raise ImportError("onnxruntime and transformers are required for the onnx embeddings backend")
+        self.model_name = model_name
+        self.model_dir = Path(model_dir) / model_name.replace("/", "--")
+        self.quantize = quantize
+        self.intra_op_threads = intra_op_threads
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self._session = None
+        self._session_pid = None
+        self._tokenizer = None
+
+    @property
+    def model_path(self) -> Path:
+        return self.model_dir / ("model.int8.onnx" if self.quantize else "model.onnx")
+
+    @property
+    def session(self) -> "onnxruntime.InferenceSession":
+        # Runtime thread pools do not survive a fork, every process opens its own session
+        if self._session is None or self._session_pid != os.getpid():
+            import onnxruntime
+            self._prepare_model()
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.intra_op_threads
+            options.inter_op_num_threads = 1
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self._session = onnxruntime.InferenceSession(
+                str(self.model_path), options, providers=["CPUExecutionProvider"]
+            )
+            self._session_pid = os.getpid()
+        return self._session
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._prepare_model()
+            self._tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+        return self._tokenizer
+
+    def _prepare_model(self) -> None:
+        """Export (and quantize) the model once, holding a lock so concurrent processes wait"""
+        if self.model_path.exists():
+            return
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.model_dir / ".export.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not (self.model_dir / "model.onnx").exists():
+                self._export()
+            if self.quantize and not self.model_path.exists():
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                tmp_path = self.model_dir / f"model.int8.{uuid.uuid4().hex}.tmp.onnx"
+                quantize_dynamic(str(self.model_dir / "model.onnx"), str(tmp_path), weight_type=QuantType.QInt8)
+                os.replace(tmp_path, self.model_path)
+
+    def _export(self) -> None:
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        tokenizer.save_pretrained(str(self.model_dir))
+        model = AutoModel.from_pretrained(self.model_name)
+        model.eval()
+
+        class Encoder(torch.nn.Module):
+            # Pass inputs by name, the positional order of forward() differs between versions
+            def __init__(self):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.model(
+                    input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+                ).last_hidden_state
+
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        tmp_path = self.model_dir / f"model.{uuid.uuid4().hex}.tmp.onnx"
+        # Newer torch defaults to the dynamo exporter (needs onnxscript), stay on the TorchScript one
+        options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                Encoder(),
+                (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+                str(tmp_path),
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    name: {0: "batch", 1: "sequence"}
+                    for name in ("input_ids", "attention_mask", "token_type_ids", "last_hidden_state")
+                },
+                opset_version=14,
+                **options
+            )
+        os.replace(tmp_path, self.model_dir / "model.onnx")
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        inputs = {
+            node.name: encoded[node.name].astype(np.int64)
+            for node in self.session.get_inputs()
+        }
+        hidden = self.session.run(None, inputs)[0]
+
+        # Mean pooling over the real tokens, then unit length
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = [
+            self._embed_batch(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        return np.concatenate(vectors).tolist() if vectors else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+def create_embeddings(embeddings_config: dict):
+    """Build the configured embedding backend: 'torch' (HuggingFaceEmbeddings) or 'onnx'"""
+    backend = embeddings_config['backend']
+    if backend == 'torch':
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(
+            model_name=embeddings_config['name'],
+            model_kwargs={'device': embeddings_config['device']}
+        )
+    if backend == 'onnx':
+        return OnnxEmbeddings(
+            embeddings_config['name'],
+            embeddings_config['onnx_dir'],
+            quantize=embeddings_config['quantize'],
+            intra_op_threads=embeddings_config['intra_op_threads'],
+            max_length=embeddings_config['max_length']
+        )
+    raise ValueError(f"Unknown embeddings backend: {backend}")
+
+
+class LazyEmbeddings:
+    """
+    Embedding backend built by create_embeddings() on first use, so importing
+    the app does not load torch or the model. serve.py still loads it before
+    forking by calling embed_query once.
+    """
+
+    def __init__(self, embeddings_config: dict):
+        self.embeddings_config = embeddings_config
+        self._model = None
+        self._lock = threading.Lock()
+        # A fork may happen while another thread is loading the model
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = create_embeddings(self.embeddings_config)
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
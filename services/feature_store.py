@@ -0,0 +1,182 @@
+import os
+import shutil
+import uuid
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from services.embedding_pool import embed_batches
+
+SIGNATURES = ("words", "char_ngrams", "word_ngrams", "phrases")
+
+# Same weights and thresholds as should_highlight / calculate_semantic_similarity
+WEIGHTS = {'cosine': 0.4, 'ngram': 0.2, 'phrase': 0.25, 'word': 0.15}
+BASE_THRESHOLD = 0.3
+OVERLAP_BOOST = 1.25
+OVERLAP_CONTAINMENT = 0.75
+
+
+def _hash_set(items) -> np.ndarray:
+    # crc32 rather than hash(): signatures must match across processes
+    return np.unique(np.fromiter(
+        (zlib.crc32(item.encode("utf-8")) for item in items), dtype=np.uint32
+    ))
+
+
+def lexical_signatures(text: str, analyzer) -> Dict[str, np.ndarray]:
+    """Hash the word, n-gram and key-phrase sets of an already normalized text"""
+    char_ngrams, word_ngrams = analyzer._get_ngrams(text, 3)
+    return {
+        "words": _hash_set(text.lower().split()),
+        "char_ngrams": _hash_set(char_ngrams),
+        "word_ngrams": _hash_set(word_ngrams),
+        "phrases": _hash_set(analyzer._find_key_phrases(text)),
+    }
+
+
+class FeatureStore:
+    """
+    Highlighting features of every highlightable block of a document.
+
+    Built once at ingestion: the normalized text of each block, its embedding
+    and hashed lexical signatures (word, character/word trigram and key
+    phrase sets). They are persisted as flat arrays next to the index, the
+    variable-length signatures in CSR form (`<kind>.npy` values plus
+    `<kind>_offsets.npy`), and memory-mapped on load. A query then only
+    embeds and normalizes the answer and scores every block in one pass.
+    """
+
+    def __init__(self, analyzer=None):
+        self.analyzer = analyzer
+        self.ids = []
+        self.pages = []
+        self.texts = []
+        self.word_counts = []
+        self.signatures = {kind: [] for kind in SIGNATURES}
+        self.embeddings = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_page(self, page_blocks: List[dict], page_num: int) -> None:
+        """Compute the lexical features of the highlightable blocks of a page"""
+        for block in page_blocks:
+            if block["type"] == "heading":
+                continue
+            normalized = self.analyzer._normalize_text(block["text"])
+            self.ids.append(block["id"])
+            self.pages.append(page_num)
+            self.texts.append(normalized)
+            self.word_counts.append(len(normalized.split()))
+            for kind, hashes in lexical_signatures(normalized, self.analyzer).items():
+                self.signatures[kind].append(hashes)
+
+    def embed(self, embeddings, batch_size: int = 32, on_progress=None) -> None:
+        """Embed the normalized texts in batches (stored as unit-length float16 rows)"""
+        if not self.texts:
+            self.embeddings = np.zeros((0, 0), dtype=np.float16)
+            return
+
+        vectors = []
+        starts = range(0, len(self.texts), batch_size)
+        for start, batch_vectors in embed_batches(embeddings, starts, lambda start: self.texts[start:start + batch_size]):
+            vectors.extend(batch_vectors)
+            if on_progress:
+                on_progress(min(start + batch_size, len(self.texts)), len(self.texts))
+
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(self.texts), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.embeddings = (matrix / np.maximum(norms, 1e-12)).astype(np.float16)
+
+    def save(self, path: Path) -> None:
+        """Write the arrays to `path`, replacing the directory atomically"""
+        path = Path(path)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.mkdir(parents=True)
+
+        np.save(tmp_path / "ids.npy", np.array(self.ids, dtype=str))
+        np.save(tmp_path / "pages.npy", np.array(self.pages, dtype=np.int32))
+        np.save(tmp_path / "word_counts.npy", np.array(self.word_counts, dtype=np.int32))
+        np.save(tmp_path / "embeddings.npy", self.embeddings)
+        for kind in SIGNATURES:
+            hashes = self.signatures[kind]
+            lengths = [len(h) for h in hashes]
+            np.save(tmp_path / f"{kind}.npy",
+                    np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint32))
+            np.save(tmp_path / f"{kind}_offsets.npy",
+                    np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+
+        if path.exists():
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["FeatureStore"]:
+        """Memory-map stored features, None if the session has none (yet)"""
+        path = Path(path)
+        if not (path / "embeddings.npy").exists():
+            return None
+
+        store = cls()
+        store.ids = np.load(path / "ids.npy")
+        if not len(store.ids):
+            return None
+        store.pages = np.load(path / "pages.npy")
+        store.word_counts = np.load(path / "word_counts.npy")
+        store.embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+        store.signatures = {
+            kind: (np.load(path / f"{kind}.npy", mmap_mode="r"), np.load(path / f"{kind}_offsets.npy"))
+            for kind in SIGNATURES
+        }
+        return store
+
+    def _jaccard(self, kind: str, answer_hashes: np.ndarray):
+        """Intersection sizes and Jaccard similarity of every block's set with the answer's"""
+        values, offsets = self.signatures[kind]
+        lengths = np.diff(offsets)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        intersection = np.bincount(rows[np.isin(values, answer_hashes)], minlength=len(lengths))
+        union = lengths + len(answer_hashes) - intersection
+        return intersection, lengths, intersection / np.maximum(union, 1)
+
+    def score(self, answer: str, embeddings, analyzer) -> Dict[str, np.ndarray]:
+        """
+        Score every block against an answer in one vectorized pass.
+
+        Mirrors should_highlight: the weighted cosine/n-gram/phrase/word
+        similarity, boosted when the block is largely contained in the answer,
+        against a threshold that depends on the block length.
+
+        Returns:
+            dict: "similarity" and boolean "highlight" arrays, one entry per block
+        """
+        normalized = analyzer._normalize_text(answer)
+        answer_signatures = lexical_signatures(normalized, analyzer)
+
+        answer_vector = np.asarray(embeddings.embed_query(normalized), dtype=np.float32)
+        answer_vector /= max(np.linalg.norm(answer_vector), 1e-12)
+        cosine = np.asarray(self.embeddings @ answer_vector, dtype=np.float32)
+
+        _, _, word_sim = self._jaccard("words", answer_signatures["words"])
+        _, _, char_sim = self._jaccard("char_ngrams", answer_signatures["char_ngrams"])
+        shared, trigrams, word_ngram_sim = self._jaccard("word_ngrams", answer_signatures["word_ngrams"])
+        _, _, phrase_sim = self._jaccard("phrases", answer_signatures["phrases"])
+
+        similarity = (
+            WEIGHTS['cosine'] * cosine
+            + WEIGHTS['ngram'] * (0.3 * char_sim + 0.7 * word_ngram_sim)
+            + WEIGHTS['phrase'] * phrase_sim
+            + WEIGHTS['word'] * word_sim
+        )
+
+        # Lexical stand-in for the sentence-by-sentence overlap check: most of
+        # the word trigrams of a block of four or more words recur in the answer
+        overlap = (trigrams >= 2) & (shared >= OVERLAP_CONTAINMENT * np.maximum(trigrams, 1))
+        similarity = np.where(overlap, similarity * OVERLAP_BOOST, similarity)
+
+        word_counts = np.asarray(self.word_counts)
+        threshold = np.full(len(similarity), BASE_THRESHOLD)
+        threshold[word_counts < 30] = BASE_THRESHOLD * 1.2
+        threshold[word_counts > 200] = BASE_THRESHOLD * 0.8
+
+        return {"similarity": similarity, "highlight": (similarity > threshold) | overlap}
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from services.session_store import SessionStore
+from services.query_generations import QueryCancelled, QueryWatch
+from app import config
+
+
+class HighlightTasks:
+    """
+    Background highlight computation of answers.
+
+    Results are published to the session store tagged with their query id,
+    so whichever web worker serves the next poll can pick them up. A task
+    belongs to a question (its QueryWatch): once a newer question starts the
+    task stops at its next check and never publishes.
+    """
+
+    def __init__(self, session_state: SessionStore = None, max_workers: int = None):
+        self.session_state = session_state or SessionStore()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.VIEWER_CONFIG['highlight_workers'],
+            thread_name_prefix="highlight"
+        )
+
+    def submit(self, watch: QueryWatch, compute: Callable[[Callable[[], None]], dict]) -> None:
+        """
+        Start computing the highlights of an answer in the background.
+
+        `compute` is called with a `check_cancelled` callable it should call
+        between expensive steps; it raises QueryCancelled once the question
+        has been superseded.
+        """
+        self._executor.submit(self._run, watch, compute)
+
+    def _run(self, watch, compute):
+        try:
+            watch.check()
+            record = {"query_id": watch.query_id, "state": "done", "result": compute(watch.check)}
+        except QueryCancelled:
+            watch.finish()
+            return
+        except Exception as e:
+            print(f"Error computing highlights: {e}")
+            record = {"query_id": watch.query_id, "state": "error"}
+
+        if watch.generations.is_current(watch.session_id, watch.query_id):
+            self.session_state.put(watch.session_id, "highlight-result", record)
+        # Highlighting is the last step of a question
+        watch.finish()
+
+    def result(self, session_id: str, query_id: str) -> Optional[dict]:
+        """Return the published record of `query_id`, None while it is still running"""
+        record = self.session_state.get(session_id, "highlight-result")
+        if not record or record["query_id"] != query_id:
+            return None
+        return record
@@ -0,0 +1,139 @@
+import fcntl
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import List
+from app import config
+
+
+class IndexJanitor:
+    """
+    Background eviction of vector index directories.
+
+    Keeps an in-memory catalog of the sessions under `root` with their size
+    on disk and last use. It is refreshed with one query of the SQLite
+    IndexCatalog (last use, touched by every load) plus a stat() per
+    directory (its mtime moves with every index save); a directory is only
+    walked again for its size when its mtime moved.
+
+    Sessions unused for `ttl_seconds` are removed, then the least recently
+    used ones until the total is back under `quota_bytes`. All of it runs in
+    a daemon thread, never on the request path, and only in one process per
+    host at a time (the holder of `.janitor.lock`).
+    """
+
+    LOCK_NAME = ".janitor.lock"
+
+    def __init__(self, root: Path, index_catalog, quota_bytes: int = None, ttl_seconds: int = None,
+                 interval_seconds: int = None):
+        self.root = Path(root)
+        self.index_catalog = index_catalog
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.quota_bytes = quota_bytes or config.INDEX_JANITOR_CONFIG['quota_bytes']
+        self.ttl_seconds = ttl_seconds or config.INDEX_JANITOR_CONFIG['ttl_seconds']
+        self.interval_seconds = interval_seconds or config.INDEX_JANITOR_CONFIG['interval_seconds']
+        self.catalog = {}
+        self._lock_file = None
+        self._thread = None
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry["size"] for entry in self.catalog.values())
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="index-janitor", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                if self._acquire():
+                    self.run_once()
+            except Exception as e:
+                print(f"Error in index janitor: {e}")
+            time.sleep(self.interval_seconds)
+
+    def _acquire(self) -> bool:
+        """Take (or keep) the host-wide janitor role"""
+        if self._lock_file is not None:
+            return True
+        handle = open(self.root / self.LOCK_NAME, "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return False
+        self._lock_file = handle
+        return True
+
+    def _dir_size(self, path: Path) -> int:
+        size = 0
+        for dirpath, _, filenames in os.walk(path):
+            for name in filenames:
+                try:
+                    size += os.stat(os.path.join(dirpath, name)).st_size
+                except OSError:
+                    continue
+        return size
+
+    def refresh(self) -> None:
+        """Bring the catalog in line with the directories on disk"""
+        last_used = self.index_catalog.sessions()
+        seen = set()
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            try:
+                dir_mtime = entry.stat().st_mtime
+            except OSError:
+                continue
+            seen.add(entry.name)
+            cached = self.catalog.get(entry.name)
+            if cached is None or cached["dir_mtime"] != dir_mtime:
+                size = self._dir_size(entry.path)
+            else:
+                size = cached["size"]
+            self.catalog[entry.name] = {
+                "size": size,
+                "dir_mtime": dir_mtime,
+                "last_used": max(dir_mtime, last_used.get(entry.name, 0))
+            }
+
+        for session_id in set(self.catalog) - seen:
+            del self.catalog[session_id]
+
+        # Catalog rows whose directory is already gone
+        now = time.time()
+        for session_id in set(last_used) - seen:
+            if now - last_used[session_id] > self.ttl_seconds:
+                self.index_catalog.delete_session(session_id)
+
+    def run_once(self) -> List[str]:
+        """Refresh the catalog and evict expired, then least recently used, sessions"""
+        self.refresh()
+        now = time.time()
+
+        evicted = [
+            session_id for session_id, entry in self.catalog.items()
+            if now - entry["last_used"] > self.ttl_seconds
+        ]
+        for session_id in evicted:
+            self._evict(session_id)
+
+        total = self.total_bytes
+        for session_id in sorted(self.catalog, key=lambda s: self.catalog[s]["last_used"]):
+            if total <= self.quota_bytes:
+                break
+            total -= self.catalog[session_id]["size"]
+            self._evict(session_id)
+            evicted.append(session_id)
+
+        return evicted
+
+    def _evict(self, session_id: str) -> None:
+        self.index_catalog.delete_session(session_id)
+        shutil.rmtree(self.root / session_id, ignore_errors=True)
+        self.catalog.pop(session_id, None)
@@ -0,0 +1,281 @@
+import importlib.util
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+MANIFEST = "manifest.json"
+CHUNKS = "chunks.json"
+
+
+class SharedDirStorage:
+    """Index bundles on a directory every node mounts (NFS, SMB, ...)"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, session_id: str, name: str) -> Path:
+        return self.root / session_id / name
+
+    def put(self, session_id: str, name: str, path: Path) -> None:
+        target = self._path(session_id, name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+
+    def get(self, session_id: str, name: str, path: Path) -> bool:
+        try:
+            shutil.copyfile(self._path(session_id, name), path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def read(self, session_id: str, name: str) -> Optional[bytes]:
+        try:
+            return self._path(session_id, name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def write(self, session_id: str, name: str, data: bytes) -> None:
+        target = self._path(session_id, name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, target)
+
+    def delete(self, session_id: str) -> None:
+        shutil.rmtree(self.root / session_id, ignore_errors=True)
+
+
+class S3Storage:
+    """
+    Index bundles in an S3-compatible bucket.
+
+    `endpoint_url` points it at any S3-compatible service, e.g. a local
+    MinIO container for development and tests.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        # Imported on first use, boto3 is slow to import
+        if importlib.util.find_spec("boto3") is None:
+            raise ImportError("boto3 is required for the s3 index storage backend")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.endpoint_url = endpoint_url
+        self._client = None
+        self._client_pid = None
+
+    @property
+    def client(self):
+        # boto3 clients must not be shared with forked processes
+        if self._client is None or self._client_pid != os.getpid():
+            import boto3
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url)
+            self._client_pid = os.getpid()
+        return self._client
+
+    def _key(self, session_id: str, name: str = "") -> str:
+        return "/".join(part for part in (self.prefix, session_id, name) if part)
+
+    def put(self, session_id: str, name: str, path: Path) -> None:
+        self.client.upload_file(str(path), self.bucket, self._key(session_id, name))
+
+    def get(self, session_id: str, name: str, path: Path) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.download_file(self.bucket, self._key(session_id, name), str(path))
+            return True
+        except ClientError:
+            return False
+
+    def read(self, session_id: str, name: str) -> Optional[bytes]:
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(session_id, name))["Body"].read()
+        except ClientError:
+            return None
+
+    def write(self, session_id: str, name: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(session_id, name), Body=data)
+
+    def delete(self, session_id: str) -> None:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(session_id) + "/"):
+            objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+
+
+def create_storage(storage_config: dict):
+    """Build the configured backend; None means bundles only live in the local index directory"""
+    backend = storage_config['backend']
+    if backend == 'local':
+        return None
+    if backend == 'shared':
+        return SharedDirStorage(storage_config['shared_dir'])
+    if backend == 's3':
+        return S3Storage(
+            storage_config['s3_bucket'],
+            storage_config['s3_prefix'],
+            storage_config['s3_endpoint_url']
+        )
+    raise ValueError(f"Unknown index storage backend: {backend}")
+
+
+class IndexBundles:
+    """
+    Publishes the index bundle of every session (index.bin, features/ and
+    an export of its catalog rows) to a storage backend and keeps a
+    node-local read-through cache of bundles in the index directory.
+
+    Bundles are versioned by a manifest written last, so a reader never
+    sees a half-published version. A complete bundle never changes again and
+    is served from the cache without asking the backend; one still being
+    ingested is re-checked at most every `check_seconds`.
+
+    Every publish uploads the whole index and catalog export again, so a
+    bundle still being ingested is published at most every
+    `partial_publish_seconds` (never with 0), not at every checkpoint.
+    """
+
+    def __init__(self, local_root: Path, backend, index_catalog, check_seconds: float = 5,
+                 partial_publish_seconds: float = 60):
+        self.local_root = Path(local_root)
+        self.backend = backend
+        self.index_catalog = index_catalog
+        self.check_seconds = check_seconds
+        self.partial_publish_seconds = partial_publish_seconds
+        self._checked = {}
+        self._published = {}
+        self._lock = threading.Lock()
+
+    def _read_manifest(self, session_dir: Path) -> Optional[dict]:
+        try:
+            with open(session_dir / MANIFEST, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_manifest(self, session_dir: Path, manifest: dict) -> None:
+        tmp_path = session_dir / f"{MANIFEST}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, session_dir / MANIFEST)
+
+    def _local_files(self, session_dir: Path) -> Dict[str, list]:
+        files = {}
+        for path in session_dir.rglob("*"):
+            parts = path.relative_to(session_dir).parts
+            # Files being written (or staged) live under a *.tmp name or directory
+            if not path.is_file() or parts == (MANIFEST,) or any(part.endswith(".tmp") for part in parts):
+                continue
+            stat = path.stat()
+            files["/".join(parts)] = [stat.st_size, stat.st_mtime]
+        return files
+
+    def _swap_in(self, staged: Path, target: Path) -> None:
+        """Move a staged file or directory into place (a directory with two renames)"""
+        if not staged.is_dir() or not target.exists():
+            os.replace(staged, target)
+            return
+        old_path = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            os.replace(target, old_path)
+        except FileNotFoundError:
+            old_path = None
+        try:
+            os.replace(staged, target)
+        except OSError:
+            # Another worker swapped in the same version first
+            pass
+        if old_path is not None:
+            shutil.rmtree(old_path, ignore_errors=True)
+
+    def publish(self, session_id: str, complete: bool) -> None:
+        """Upload the files of a session that changed since its last publish"""
+        if self.backend is None:
+            return
+        if complete:
+            self._published.pop(session_id, None)
+        else:
+            last = self._published.get(session_id)
+            if not self.partial_publish_seconds or (
+                last is not None and time.monotonic() - last < self.partial_publish_seconds
+            ):
+                return
+            self._published[session_id] = time.monotonic()
+
+        session_dir = self.local_root / session_id
+        export_path = session_dir / f"{CHUNKS}.{uuid.uuid4().hex}.tmp"
+        with open(export_path, "w") as f:
+            json.dump(self.index_catalog.export_session(session_id), f)
+        os.replace(export_path, session_dir / CHUNKS)
+
+        previous = (self._read_manifest(session_dir) or {}).get("files", {})
+        files = self._local_files(session_dir)
+        for name, stat in files.items():
+            if previous.get(name) != stat:
+                self.backend.put(session_id, name, session_dir / name)
+
+        manifest = {"version": uuid.uuid4().hex, "complete": complete, "files": files}
+        self.backend.write(session_id, MANIFEST, json.dumps(manifest).encode("utf-8"))
+        self._write_manifest(session_dir, manifest)
+
+    def ensure(self, session_id: str) -> None:
+        """Make sure the node-local copy of a session's bundle is current"""
+        if self.backend is None:
+            return
+
+        session_dir = self.local_root / session_id
+        local = self._read_manifest(session_dir)
+        if local and local["complete"]:
+            return
+
+        with self._lock:
+            if time.monotonic() - self._checked.get(session_id, 0) < self.check_seconds and local:
+                return
+            self._checked[session_id] = time.monotonic()
+
+        data = self.backend.read(session_id, MANIFEST)
+        if data is None:
+            return
+        remote = json.loads(data)
+        if local and local["version"] == remote["version"]:
+            return
+
+        session_dir.mkdir(parents=True, exist_ok=True)
+        local_files = (local or {}).get("files", {})
+        changed = {
+            name for name, stat in remote["files"].items()
+            if local_files.get(name) != stat or not (session_dir / name).exists()
+        }
+        # Changed entries (index.bin, features/, ...) are assembled whole in a
+        # staging directory and swapped in, so readers never see a half-synced one
+        entries = {name.split("/")[0] for name in changed}
+        staging = session_dir / f".sync.{uuid.uuid4().hex}.tmp"
+        try:
+            for name in remote["files"]:
+                if name.split("/")[0] not in entries:
+                    continue
+                target = staging / name
+                target.parent.mkdir(parents=True, exist_ok=True)
+                if name not in changed:
+                    shutil.copyfile(session_dir / name, target)
+                elif not self.backend.get(session_id, name, target):
+                    print(f"Index bundle of {session_id} is missing {name}, not syncing it")
+                    return
+            for entry in entries:
+                self._swap_in(staging / entry, session_dir / entry)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        with open(session_dir / CHUNKS, "r") as f:
+            self.index_catalog.import_session(session_id, json.load(f))
+        # Local stats differ from the publisher's, keep the remote ones for comparison
+        self._write_manifest(session_dir, remote)
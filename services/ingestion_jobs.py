@@ -0,0 +1,271 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import fcntl
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+from app import config
+
+
+class JobCancelled(Exception):
+    """Raised inside an ingestion job once its cancel flag is set"""
+
+
+class JobProgress:
+    """
+    File-backed progress record of one ingestion job.
+
+    Status and cancel flag live in `root` so any web worker can poll or
+    cancel a job, whichever worker submitted it.
+    """
+
+    def __init__(self, job_id: str, root: Path):
+        self.job_id = job_id
+        self.root = Path(root)
+        self.status_path = self.root / f"{job_id}.json"
+        self.cancel_path = self.root / f"{job_id}.cancel"
+        # Pipeline stages report progress from several threads
+        self._lock = threading.Lock()
+
+    def read(self) -> Optional[dict]:
+        try:
+            with open(self.status_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update(self, **fields) -> None:
+        with self._lock:
+            status = self.read() or {"job_id": self.job_id}
+            status.update(fields)
+            status["updated"] = datetime.now().isoformat()
+
+            tmp_path = self.status_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(status, f)
+            os.replace(tmp_path, self.status_path)
+
+    def cancel(self) -> None:
+        self.cancel_path.touch()
+
+    def cancelled(self) -> bool:
+        return self.cancel_path.exists()
+
+    def check_cancelled(self) -> None:
+        if self.cancelled():
+            raise JobCancelled(self.job_id)
+
+
+def _init_pool_process() -> None:
+    """
+    Cap the intra-op thread pools inherited from the web worker to one thread.
+
+    Pool processes are forked from web workers that have already run
+    queries with multi-threaded torch/faiss and other threads alive; a
+    multi-threaded pool can deadlock in the child on its first embed.
+    """
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(1)
+    faiss = sys.modules.get("faiss")
+    if faiss is not None:
+        faiss.omp_set_num_threads(1)
+
+
+def _acquire_slot(root: Path, max_concurrent: int, progress: JobProgress):
+    """
+    Block until one of `max_concurrent` host-wide ingestion slots is free.
+
+    Slots are flock()ed files, so the cap holds across every web worker's
+    pool and a slot is released automatically if its process dies.
+    """
+    while True:
+        for slot in range(max_concurrent):
+            handle = open(root / f"slot-{slot}.lock", "w")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return handle
+            except BlockingIOError:
+                handle.close()
+        progress.check_cancelled()
+        time.sleep(0.5)
+
+
+def run_ingestion(job_id: str, session_id: str, path: str, filename: str, root: str) -> None:
+    """Extract, embed and index one uploaded document (runs in a pool process)"""
+    from services.document_processor import DocumentProcessor
+    from services.feature_store import FeatureStore
+    from services.session_store import SessionStore
+    from services.source_index import SourceIndex
+    from services.vector_store import VectorStoreService, embedding_stats
+    from utils.visualization import DocumentVisualizer, text_analyzer
+
+    root = Path(root)
+    progress = JobProgress(job_id, root)
+    session_state = SessionStore()
+    is_pdf = filename.lower().endswith('.pdf')
+    slot = None
+    extracted = {"pages_total": None, "viewer_pages": 0}
+
+    def on_page(pages_done, pages_total):
+        progress.check_cancelled()
+        extracted["pages_total"] = pages_total
+        progress.update(pages_extracted=pages_done, pages_total=pages_total)
+
+    def on_chunk(chunks_done, chunks_total):
+        progress.check_cancelled()
+        progress.update(chunks_embedded=chunks_done, embedding=embedding_stats())
+
+    def on_features(lines_done, lines_total):
+        progress.check_cancelled()
+        progress.update(lines_embedded=lines_done, lines_total=lines_total, embedding=embedding_stats())
+
+    def on_checkpoint(pages_indexed, complete):
+        # Queries against the partial index report which pages they covered
+        session_state.put(session_id, "coverage", {
+            "pages_indexed": pages_indexed,
+            "pages_total": extracted["pages_total"],
+            "unit": "pages" if is_pdf else "parts",
+            "complete": complete
+        })
+        progress.update(searchable=True, pages_indexed=pages_indexed)
+
+    def publish_pages(pages, separator):
+        # Each viewer page is stored on its own as soon as it exists, so the
+        # browser can show it while the rest of the document is processed.
+        # The text passed on for chunking is rebuilt from the same blocks so
+        # every chunk can be traced back to them.
+        page_texts = []
+        for page_blocks in pages:
+            page_texts.append(source_index.add_page(page_blocks, extracted["viewer_pages"], separator))
+            features.add_page(page_blocks, extracted["viewer_pages"])
+            session_state.put(session_id, f"page-{extracted['viewer_pages']}", page_blocks)
+            extracted["viewer_pages"] += 1
+        session_state.put(session_id, "page_count", extracted["viewer_pages"])
+        return "".join(page_texts)
+
+    try:
+        slot = _acquire_slot(root, config.INGESTION_CONFIG['max_concurrent'], progress)
+        progress.update(state="processing")
+        session_state.put(session_id, "page_count", 0)
+
+        processor = DocumentProcessor()
+        source_index = SourceIndex()
+        features = FeatureStore(text_analyzer)
+        # Images and tables of formats extracted in the same pass as the text
+        assets = {}
+
+        def extracted_texts():
+            # Extractors open the upload by path, so it is never held in memory whole
+            for page_layout, page_text in processor.iter_text_pages(path, filename, on_page, assets):
+                if page_layout is not None:
+                    yield publish_pages(
+                        [DocumentVisualizer.build_pdf_page(page_layout, extracted["viewer_pages"])], "\n"
+                    )
+                else:
+                    yield publish_pages(DocumentVisualizer.build_text_pages(
+                        page_text,
+                        extracted["viewer_pages"],
+                        config.VIEWER_CONFIG['sections_per_page']
+                    ), "\n\n")
+
+        # Pages flow through extraction, chunking and embedding concurrently
+        vector_store = VectorStoreService()
+        vector_store.build_vectorstore(
+            extracted_texts(),
+            session_id=session_id,
+            on_progress=on_chunk,
+            on_checkpoint=on_checkpoint,
+            source_index=source_index,
+            filename=filename
+        )
+        progress.check_cancelled()
+
+        # Per-line features make query-time highlighting a single vectorized pass
+        progress.update(state="indexing lines")
+        features.embed(vector_store.embeddings, config.INGESTION_CONFIG['embed_batch_size'], on_features)
+        vector_store.save_features(session_id, features)
+
+        if is_pdf:
+            assets = {"images": processor._extract_images(path), "tables": processor._extract_tables(path)}
+        if assets:
+            session_state.put(session_id, "images", assets["images"])
+            # Normalized once here, so paging a table only slices it
+            tables = [DocumentVisualizer.prepare_table(df) for df in assets["tables"]]
+            session_state.put(session_id, "tables", tables)
+        progress.update(state="done")
+
+    except Exception as e:
+        if progress.cancelled():
+            progress.update(state="cancelled")
+        else:
+            progress.update(state="error", error=str(e))
+
+    finally:
+        if slot is not None:
+            slot.close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class IngestionJobs:
+    """Local process-pool queue of document ingestion jobs"""
+
+    def __init__(self, root: Path = None, max_workers: int = None):
+        self.root = Path(root or config.INGESTION_CONFIG['jobs_dir'])
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers or config.INGESTION_CONFIG['max_concurrent']
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created lazily so each forked web worker gets its own pool
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(config.INGESTION_CONFIG['start_method']),
+                    initializer=_init_pool_process
+                )
+            return self._executor
+
+    def submit(self, session_id: str, path: Path, filename: str, job_id: str = None) -> str:
+        """Queue a document for ingestion and return the job id immediately"""
+        job_id = job_id or str(uuid.uuid4())
+        JobProgress(job_id, self.root).update(
+            state="queued",
+            session_id=session_id,
+            filename=filename,
+            path=str(path),
+            pages_extracted=0,
+            pages_total=None,
+            chunks_embedded=0
+        )
+        future = self._get_executor().submit(
+            run_ingestion, job_id, session_id, str(path), filename, str(self.root)
+        )
+        self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._futures.pop(job_id, None))
+        return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        return JobProgress(job_id, self.root).read()
+
+    def cancel(self, job_id: str) -> None:
+        """Cancel a job, dropping it from the queue if it has not started yet"""
+        progress = JobProgress(job_id, self.root)
+        progress.cancel()
+
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            progress.update(state="cancelled")
+            Path(progress.read()["path"]).unlink(missing_ok=True)
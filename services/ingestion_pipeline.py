@@ -0,0 +1,86 @@
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List
+
+_DONE = object()
+POLL_SECONDS = 0.1
+
+
+class _Failure:
+    """Carries an exception raised inside a stage to the consuming thread"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _pump(iterable: Iterable, out_queue: queue.Queue, stop: threading.Event) -> None:
+    """Run one stage in its own thread, pushing results into a bounded queue"""
+    def put(item):
+        # A full queue blocks the stage (back-pressure) until the consumer catches up
+        while not stop.is_set():
+            try:
+                out_queue.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for item in iterable:
+            if not put(item):
+                return
+    except BaseException as e:
+        put(_Failure(e))
+        return
+    put(_DONE)
+
+
+def _drain(in_queue: queue.Queue, stop: threading.Event) -> Iterator:
+    while not stop.is_set():
+        try:
+            item = in_queue.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, _Failure):
+            raise item.error
+        yield item
+
+
+def run_pipeline(source: Iterable, *stages: Callable[[Iterable], Iterable], maxsize: int = 8) -> Iterator:
+    """
+    Chain generator stages so they run concurrently.
+
+    Every stage is a function taking an iterable and returning an iterable.
+    The source and each stage but the last run in their own thread and are
+    connected by queues of at most `maxsize` items, so a slow stage holds
+    back the ones before it instead of letting memory grow. The last stage
+    runs in the caller's thread as it iterates the result.
+
+    Exceptions raised in any stage are re-raised to the caller; stopping the
+    iteration early (or an exception in the caller) stops every stage.
+    """
+    stop = threading.Event()
+    iterable = source
+    for stage in stages:
+        stage_queue = queue.Queue(maxsize=maxsize)
+        threading.Thread(target=_pump, args=(iterable, stage_queue, stop), daemon=True).start()
+        iterable = stage(_drain(stage_queue, stop))
+
+    try:
+        yield from iterable
+    finally:
+        stop.set()
+
+
+def batched(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most `batch_size` items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
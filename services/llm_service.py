@@ -1,39 +1,88 @@
-import openai
+import hashlib
+import json
 import re
+from services.single_flight import SingleFlight
+
+# In-flight completions shared by identical concurrent requests of this process
+llm_flights = SingleFlight()
+
+class ResponseCancelled(Exception):
+    """Raised when a streamed answer is abandoned by its caller"""
 
 class LLMService:
     def __init__(self, api_key, api_base, api_version, deployment_name):
+        # Imported on the first query rather than at app start
+        import openai
         openai.api_type = "azure"
         openai.api_base = api_base
         openai.api_version = api_version
         openai.api_key = api_key
         self.deployment_name = deployment_name
 
-    def get_response(self, context, query):
-        """Get response from LLM based on context and query"""
+    def get_response(self, context, query, cancelled=None):
+        """
+        Get response from LLM based on context and query.
+
+        Identical concurrent requests (same deployment, prompt and sampling
+        parameters) share one streamed completion. With a `cancelled` callable
+        the caller stops waiting as soon as it returns True and
+        ResponseCancelled is raised; the HTTP stream itself is closed once no
+        request is waiting for it any more.
+        """
+        messages = [
+            {
+                "role": "system", 
+                "content": "You are a helpful assistant that answers questions based on the provided document context."
+            },
+            {
+                "role": "user", 
+                "content": f"Context:\n{context}\n\nQuestion:\n{query}"
+            },
+        ]
+        params = {"temperature": 0.7, "max_tokens": 800}
+
         try:
-            response = openai.ChatCompletion.create(
-                engine=self.deployment_name,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are a helpful assistant that answers questions based on the provided document context."
-                    },
-                    {
-                        "role": "user", 
-                        "content": f"Context:\n{context}\n\nQuestion:\n{query}"
-                    },
-                ],
-                temperature=0.7,
-                max_tokens=800,
+            tokens = llm_flights.stream(
+                self._request_key(messages, params),
+                lambda: self._stream_completion(messages, params),
+                cancelled
             )
-            return response.choices[0].message.content
+            reply = "".join(tokens)
+            if cancelled is not None and cancelled():
+                raise ResponseCancelled()
+            return reply
+        except ResponseCancelled:
+            raise
         except Exception as e:
             print(f"Error getting LLM response: {e}")
             return None
 
+    def _request_key(self, messages, params):
+        """Hash of everything that determines a completion"""
+        payload = json.dumps([self.deployment_name, messages, params], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _stream_completion(self, messages, params):
+        """Yield the content tokens of a streamed chat completion"""
+        import openai
+        response = openai.ChatCompletion.create(
+            engine=self.deployment_name,
+            messages=messages,
+            stream=True,
+            **params
+        )
+        try:
+            for chunk in response:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.get("content") or ""
+        finally:
+            # Closing the stream drops the connection to the API
+            if hasattr(response, "close"):
+                response.close()
+
     def rank_chunks_with_llm(self, chunk_mapping, context_chunks, query, assistant_reply):
         """Have LLM rank the context chunks based on their relevance to the answer"""
+        import openai
         chunks_to_rank = []
         for chunk in context_chunks:
             chunk_text = chunk_mapping[chunk['chunk_id']]
@@ -0,0 +1,78 @@
+import threading
+import time
+import uuid
+from services.session_store import SessionStore
+
+
+class QueryCancelled(Exception):
+    """Raised inside the work for a question once a newer question superseded it"""
+
+
+class QueryWatch:
+    """Cancellation handle of one question, handed to the steps that answer it"""
+
+    # Questions started through another worker are only seen through the
+    # session store, which is re-read at most this often
+    CHECK_INTERVAL = 0.2
+
+    def __init__(self, generations: "QueryGenerations", session_id: str, query_id: str, event: threading.Event):
+        self.generations = generations
+        self.session_id = session_id
+        self.query_id = query_id
+        self.event = event
+        self._last_check = time.monotonic()
+
+    def cancelled(self) -> bool:
+        if self.event.is_set():
+            return True
+        if time.monotonic() - self._last_check > self.CHECK_INTERVAL:
+            self._last_check = time.monotonic()
+            if not self.generations.is_current(self.session_id, self.query_id):
+                self.event.set()
+        return self.event.is_set()
+
+    def check(self) -> None:
+        if self.cancelled():
+            raise QueryCancelled(self.query_id)
+
+    def finish(self) -> None:
+        """Called once all work for the question is over (answer and highlights)"""
+        self.generations.finish(self.session_id, self.event)
+
+
+class QueryGenerations:
+    """
+    Tracks the latest question of every session.
+
+    Starting a question makes it the session's current generation, stored in
+    the session store so every web worker sees it. Work still running for an
+    older question (retrieval, the LLM call, highlighting) notices through its
+    QueryWatch and stops; in the worker that runs it, immediately.
+    """
+
+    def __init__(self, session_state: SessionStore = None):
+        self.session_state = session_state or SessionStore()
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def start(self, session_id: str) -> QueryWatch:
+        """Begin a new question, superseding every older one of the session"""
+        query_id = str(uuid.uuid4())
+        self.session_state.put(session_id, "query-generation", query_id)
+
+        event = threading.Event()
+        with self._lock:
+            previous = self._events.get(session_id)
+            self._events[session_id] = event
+        if previous is not None:
+            previous.set()
+        return QueryWatch(self, session_id, query_id, event)
+
+    def finish(self, session_id: str, event: threading.Event) -> None:
+        """Forget the event of a finished question unless a newer one replaced it"""
+        with self._lock:
+            if self._events.get(session_id) is event:
+                del self._events[session_id]
+
+    def is_current(self, session_id: str, query_id: str) -> bool:
+        return self.session_state.get(session_id, "query-generation") == query_id
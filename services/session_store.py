@@ -0,0 +1,220 @@
+from collections import OrderedDict
+import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+import weakref
+from pathlib import Path
+from typing import Any, Optional
+from app import config
+
+
+class SessionStore:
+    """
+    Session-keyed server-side state with two tiers.
+
+    - Memory tier: an LRU of unpickled values, bounded by the total pickled
+      size of its entries (`max_memory_bytes`).
+    - Disk tier: one pickle file per (session, name) under `root`. Every put
+      is written through, so entries evicted from memory spill to disk for
+      free and every worker process sharing `root` sees the same state.
+
+    Entries not accessed for `ttl_seconds` expire from both tiers. Expiry
+    runs in one daemon thread per process (see `_sweep_loop`), never on the
+    request path.
+    """
+
+    TOUCH_INTERVAL = 60  # seconds between mtime refreshes of a disk entry
+
+    def __init__(self, root: Path = None, max_memory_bytes: int = None, ttl_seconds: int = None):
+        self.root = Path(root or config.SESSION_STORE_CONFIG['dir'])
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_memory_bytes = max_memory_bytes or config.SESSION_STORE_CONFIG['max_memory_bytes']
+        self.ttl_seconds = ttl_seconds or config.SESSION_STORE_CONFIG['ttl_seconds']
+
+        # (session_id, name) -> {"value", "size", "mtime_ns", "last_access"}
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        _start_sweeper(self)
+
+    def _path(self, session_id: str, name: str) -> Path:
+        return self.root / session_id / f"{name}.pkl"
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    def put(self, session_id: str, name: str, value: Any) -> int:
+        """
+        Store a value for a session.
+
+        Returns:
+            int: accounted size of the entry in bytes
+        """
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        path = self._path(session_id, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Atomic replace so readers in other workers never see a partial file
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        self._remember(session_id, name, value, len(payload), path.stat().st_mtime_ns)
+        _start_sweeper(self)
+        return len(payload)
+
+    def get(self, session_id: str, name: str, default: Any = None) -> Any:
+        """Return a session value, promoting it from disk to memory on a miss"""
+        if not session_id:
+            return default
+
+        key = (session_id, name)
+        path = self._path(session_id, name)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self._forget(key)
+            return default
+
+        now = time.time()
+        if now - stat.st_mtime > self.ttl_seconds:
+            self.delete(session_id, name)
+            return default
+
+        with self._lock:
+            entry = self._memory.get(key)
+            # Another worker may have replaced the entry since it was cached
+            if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns:
+                self._memory.move_to_end(key)
+                entry["last_access"] = now
+                value = entry["value"]
+            else:
+                entry = None
+
+        if entry is None:
+            try:
+                with open(path, "rb") as f:
+                    payload = f.read()
+            except FileNotFoundError:
+                return default
+            value = pickle.loads(payload)
+            self._remember(session_id, name, value, len(payload), stat.st_mtime_ns)
+
+        if now - stat.st_mtime > self.TOUCH_INTERVAL:
+            self._touch(key, path)
+        return value
+
+    def delete(self, session_id: str, name: Optional[str] = None) -> None:
+        """Delete one entry, or the whole session when `name` is omitted"""
+        with self._lock:
+            for key in [k for k in self._memory if k[0] == session_id and (name is None or k[1] == name)]:
+                self._forget(key)
+
+        try:
+            if name is None:
+                shutil.rmtree(self.root / session_id, ignore_errors=True)
+            else:
+                self._path(session_id, name).unlink()
+        except FileNotFoundError:
+            pass
+
+    def evict_expired(self) -> None:
+        """Drop every entry that has not been accessed within the TTL"""
+        self._evict_memory()
+        self._evict_disk()
+
+    def _evict_memory(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                key for key, entry in self._memory.items()
+                if now - entry["last_access"] > self.ttl_seconds
+            ]
+            for key in expired:
+                self._forget(key)
+
+    def _evict_disk(self):
+        now = time.time()
+        for session_dir in self.root.glob("*"):
+            try:
+                files = list(session_dir.glob("*.pkl"))
+                last_used = max((f.stat().st_mtime for f in files), default=0)
+                if now - last_used > self.ttl_seconds:
+                    self.delete(session_dir.name)
+            except Exception as e:
+                print(f"Error cleaning up session state {session_dir}: {e}")
+
+    def _remember(self, session_id, name, value, size, mtime_ns):
+        key = (session_id, name)
+        with self._lock:
+            self._forget(key)
+            # Entries larger than the whole memory budget stay disk-only
+            if size > self.max_memory_bytes:
+                return
+            self._memory[key] = {
+                "value": value,
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "last_access": time.time()
+            }
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted["size"]
+
+    def _forget(self, key):
+        with self._lock:
+            entry = self._memory.pop(key, None)
+            if entry is not None:
+                self._memory_bytes -= entry["size"]
+
+    def _touch(self, key, path):
+        try:
+            os.utime(path)
+            with self._lock:
+                entry = self._memory.get(key)
+                if entry is not None:
+                    entry["mtime_ns"] = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._forget(key)
+
+
+# Stores of this process, swept by its sweeper thread
+_stores = weakref.WeakSet()
+_sweeper_lock = threading.Lock()
+_sweeper_pid = None
+
+
+def _start_sweeper(store: SessionStore) -> None:
+    """Register a store and start this process's sweeper thread if it is not running (threads do not survive a fork)"""
+    global _sweeper_pid
+    if _sweeper_pid == os.getpid() and store in _stores:
+        return
+    with _sweeper_lock:
+        _stores.add(store)
+        if _sweeper_pid != os.getpid():
+            _sweeper_pid = os.getpid()
+            threading.Thread(target=_sweep_loop, name="session-sweeper", daemon=True).start()
+
+
+def _sweep_loop():
+    while True:
+        time.sleep(config.SESSION_STORE_CONFIG['sweep_seconds'])
+        try:
+            _sweep_once()
+        except Exception as e:
+            print(f"Error in session sweeper: {e}")
+
+
+def _sweep_once():
+    stores = list(_stores)
+    for store in stores:
+        store._evict_memory()
+    # Stores sharing a root scan its directory once
+    for store in {store.root: store for store in stores}.values():
+        store._evict_disk()
@@ -0,0 +1,118 @@
+import threading
+from typing import Callable, Iterator, Optional
+
+
+class FlightAbandoned(Exception):
+    """The stream of a call was broken off because its last waiter left"""
+
+
+class _Flight:
+    """One in-flight call and the tokens it has produced so far"""
+
+    def __init__(self):
+        self.tokens = []
+        self.done = False
+        self.abandoned = False
+        self.error = None
+        self.waiters = 0
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """
+    Share one in-flight streamed call between concurrent identical requests.
+
+    The first request for a key starts `produce()` in a thread of its own;
+    requests for the same key arriving while it runs attach to it and receive
+    every token from the start, then follow the live stream. Once the last
+    waiter has gone (e.g. all of them were cancelled) the stream is closed.
+    Nothing is cached: a request arriving after the call finished starts a
+    new one.
+    """
+
+    # How often a waiter blocked on the next token checks its cancel flag
+    WAIT_SECONDS = 0.1
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def stream(self, key: str, produce: Callable[[], Iterator[str]],
+               cancelled: Optional[Callable[[], bool]] = None) -> Iterator[str]:
+        """
+        Yield the tokens of the call for `key`, starting it if none is in flight.
+
+        Stops early (without an error) once `cancelled()` returns True, the
+        caller decides what a cancelled answer means.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+            with flight.cond:
+                flight.waiters += 1
+
+        if leader:
+            threading.Thread(target=self._run, args=(key, flight, produce), daemon=True).start()
+
+        try:
+            yield from self._follow(flight, cancelled)
+        finally:
+            # Under the registry lock, so no request can attach between the
+            # last waiter leaving and the flight being dropped
+            with self._lock:
+                with flight.cond:
+                    flight.waiters -= 1
+                    if flight.waiters == 0 and not flight.done:
+                        # Nobody is listening any more, later requests start afresh
+                        flight.abandoned = True
+                        if self._flights.get(key) is flight:
+                            del self._flights[key]
+
+    def _follow(self, flight: _Flight, cancelled):
+        position = 0
+        while True:
+            with flight.cond:
+                while position >= len(flight.tokens) and not flight.done:
+                    if cancelled and cancelled():
+                        return
+                    flight.cond.wait(self.WAIT_SECONDS)
+                tokens = flight.tokens[position:]
+                done = flight.done
+
+            for token in tokens:
+                if cancelled and cancelled():
+                    return
+                position += 1
+                yield token
+
+            if done and position >= len(flight.tokens):
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+    def _run(self, key: str, flight: _Flight, produce):
+        stream = None
+        try:
+            stream = produce()
+            for token in stream:
+                with flight.cond:
+                    if flight.abandoned:
+                        # A partial stream must never pass for a finished one
+                        flight.error = FlightAbandoned("flight abandoned")
+                        break
+                    flight.tokens.append(token)
+                    flight.cond.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                with flight.cond:
+                    flight.done = True
+                    flight.cond.notify_all()
@@ -0,0 +1,62 @@
+from bisect import bisect_right
+from typing import List
+
+
+class SourceIndex:
+    """
+    Character offsets of the viewer blocks within the document text.
+
+    The text that is chunked and embedded is built from the rendered blocks
+    themselves (see `add_page`), so the [start, end) range of a chunk in that
+    text maps straight back to the blocks it was cut from, without comparing
+    any text.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.block_ids = []
+        self.pages = []
+        self.length = 0
+
+    def add_page(self, page_blocks: List[dict], page_num: int, separator: str = "\n") -> str:
+        """
+        Register the blocks of one viewer page and return the page text.
+
+        Headings are part of the text (they give chunks context) but are not
+        highlightable, so they take up offsets without an entry.
+        """
+        parts = []
+        for block in page_blocks:
+            text = block["text"]
+            if block["type"] != "heading":
+                self.starts.append(self.length)
+                self.ends.append(self.length + len(text))
+                self.block_ids.append(block["id"])
+                self.pages.append(page_num)
+            parts.append(text + separator)
+            self.length += len(text) + len(separator)
+        return "".join(parts)
+
+    def locate(self, start: int, end: int) -> List[dict]:
+        """
+        Return the blocks covered by the text range [start, end).
+
+        Each entry holds the block id, its page, the covered character range
+        within the block and the offset of that range within the chunk.
+        """
+        sources = []
+        # Blocks are stored in text order, so the first candidate is a bisection away
+        for i in range(bisect_right(self.ends, start), len(self.starts)):
+            block_start = self.starts[i]
+            if block_start >= end:
+                break
+            covered_start = max(start, block_start)
+            sources.append({
+                "id": self.block_ids[i],
+                "page": self.pages[i],
+                "start": covered_start - block_start,
+                "end": min(end, self.ends[i]) - block_start,
+                "offset": covered_start - start
+            })
+        return sources
@@ -3,11 +3,8 @@
 import re
 import numpy as np
 from typing import Set, List, Tuple, Dict
-from langchain_huggingface import HuggingFaceEmbeddings
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    model_kwargs={'device': 'cpu'}
-)
+# Share the vector store's model (or embedding pool) instead of loading a second copy per process
+from services.vector_store import embedding_service
 
 class TextAnalyzer:
     def __init__(self):
@@ -17,7 +14,7 @@ class TextAnalyzer:
         Args:
             embeddings_model: Model for creating text embeddings
         """
-        self.embeddings = embeddings
+        self.embeddings = embedding_service
 
     def calculate_semantic_similarity(self, text1: str, text2: str) -> float:
         """
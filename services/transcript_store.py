@@ -0,0 +1,47 @@
+from datetime import datetime
+import json
+from pathlib import Path
+from typing import List, Dict
+from app import config
+
+
+class TranscriptStore:
+    """
+    Optional server-side copy of each session's chat transcript.
+
+    The browser only ever receives new chat messages as partial updates, so
+    the full conversation is kept here as an append-only JSON-lines file per
+    session instead of round-tripping through the chat-history component.
+    """
+
+    def __init__(self, root: Path = None, enabled: bool = None):
+        self.enabled = config.TRANSCRIPT_CONFIG['enabled'] if enabled is None else enabled
+        self.root = Path(root or config.TRANSCRIPT_CONFIG['dir'])
+        if self.enabled:
+            self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, session_id: str) -> Path:
+        return self.root / f"{session_id}.jsonl"
+
+    def append(self, session_id: str, role: str, text: str) -> None:
+        """Append one message to the session transcript"""
+        if not self.enabled or not session_id:
+            return
+        record = {
+            "time": datetime.now().isoformat(),
+            "role": role,
+            "text": text
+        }
+        try:
+            with open(self._path(session_id), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Error writing transcript for {session_id}: {e}")
+
+    def load(self, session_id: str) -> List[Dict[str, str]]:
+        """Return the full transcript of a session, oldest message first"""
+        path = self._path(session_id)
+        if not self.enabled or not path.exists():
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
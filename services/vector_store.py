@@ -1,170 +1,284 @@
-from datetime import datetime
-import json
-import shutil
+import functools
+import os
+import sqlite3
+import time
 from pathlib import Path
-import tempfile
 import uuid
 import numpy as np
-import faiss
-from langchain_community.vectorstores import FAISS
-from langchain.schema import Document
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    model_kwargs={'device': 'cpu'}
+from services.ingestion_pipeline import run_pipeline, batched
+from services.feature_store import FeatureStore
+from services.catalog import IndexCatalog, CatalogDocstore
+from services.index_storage import IndexBundles, create_storage
+from services.embeddings import LazyEmbeddings
+from services.embedding_pool import EmbeddingPool, embed_batches
+from app import config
+
+# faiss, langchain and the embedding model are loaded on first use, not when
+# the app is imported
+embeddings = LazyEmbeddings(config.EMBEDDINGS_MODEL)
+
+# What everything embeds through: the model itself, or a pool of worker
+# processes sharing it (EMBEDDING_POOL_WORKERS)
+if config.EMBEDDING_POOL_CONFIG['workers'] > 0:
+    embedding_service = EmbeddingPool(
+        embeddings,
+        config.EMBEDDING_POOL_CONFIG['workers'],
+        max_batch=config.EMBEDDING_POOL_CONFIG['max_batch'],
+        slots_per_worker=config.EMBEDDING_POOL_CONFIG['slots_per_worker'],
+        start_method=config.INGESTION_CONFIG['start_method']
+    )
+else:
+    embedding_service = embeddings
+
+@functools.lru_cache(maxsize=None)
+def get_text_splitter():
+    """Text splitting configuration, built once per process on first use"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=500,
+        chunk_overlap=50,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+
+MAX_CHUNKS = 1000
+
+# Node-local index directory; with a shared backend it is a read-through cache
+INDEX_DIR = Path(config.TEMP_DIR)
+catalog = IndexCatalog(INDEX_DIR / "catalog.db")
+bundles = IndexBundles(
+    INDEX_DIR,
+    create_storage(config.STORAGE_CONFIG),
+    catalog,
+    config.STORAGE_CONFIG['manifest_check_seconds'],
+    config.STORAGE_CONFIG['partial_publish_seconds']
 )
 
-# Text splitting configuration
-text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=500,
-    chunk_overlap=50,
-    length_function=len,
-    separators=["\n\n", "\n", ". ", " ", ""]
-)
+def embedding_stats():
+    """Queue depth and throughput of the embedding pool, empty without one"""
+    if isinstance(embedding_service, EmbeddingPool):
+        return embedding_service.stats()
+    return {}
 
 class VectorStoreService:
     def __init__(self):
-        self.embeddings = embeddings
-        self.text_splitter = text_splitter
-        self.TEMP_DIR = Path(tempfile.gettempdir()) / "faiss_indices"
+        self.embeddings = embedding_service
+        self.text_splitter = get_text_splitter()
+        self.TEMP_DIR = INDEX_DIR
+        self.catalog = catalog
+        self.bundles = bundles
         self.TEMP_DIR.mkdir(exist_ok=True)
 
-    def create_vectorstore_and_mapping(self, text):
+    def iter_chunks(self, texts, max_chunks=MAX_CHUNKS):
+        """
+        Split a stream of page texts into chunks.
+
+        The text from the start of the last, possibly unfinished chunk of each
+        page is carried over and split again together with the next page. Once
+        `max_chunks` chunks have been produced the remaining texts are still
+        consumed (extraction keeps feeding the viewer) but no longer split.
+
+        Yields:
+            Tuple[str, int, Optional[int]]: chunk text, index of the last page
+            it covers and offset of the chunk in the concatenated page texts
+            (None if the splitter did not return it verbatim)
+        """
+        produced = 0
+        buffer = ""
+        buffer_offset = 0
+        page_num = -1
+        for page_num, text in enumerate(texts):
+            if produced >= max_chunks:
+                continue
+
+            buffer += text
+            pieces = self.text_splitter.split_text(buffer)
+            if not pieces:
+                buffer_offset += len(buffer)
+                buffer = ""
+                continue
+
+            starts = self._locate_pieces(buffer, pieces)
+            for piece, start in list(zip(pieces, starts))[:-1][:max_chunks - produced]:
+                produced += 1
+                yield piece, page_num, None if start is None else buffer_offset + start
+
+            carry_start = starts[-1]
+            if carry_start is None:
+                carry_start = max(0, len(buffer) - len(pieces[-1]))
+            buffer = buffer[carry_start:]
+            buffer_offset += carry_start
+
+        if buffer.strip() and produced < max_chunks:
+            pieces = self.text_splitter.split_text(buffer)
+            starts = self._locate_pieces(buffer, pieces)
+            for piece, start in list(zip(pieces, starts))[:max_chunks - produced]:
+                yield piece, page_num, None if start is None else buffer_offset + start
+
+    @staticmethod
+    def _locate_pieces(text, pieces):
+        """Find the start of each split piece in `text` (chunks overlap but never go backwards)"""
+        starts = []
+        search_from = 0
+        for piece in pieces:
+            start = text.find(piece, search_from)
+            if start == -1:
+                starts.append(None)
+            else:
+                starts.append(start)
+                search_from = start + 1
+        return starts
+
+    def build_vectorstore(self, texts, session_id=None, on_progress=None, on_checkpoint=None, source_index=None,
+                          filename=None):
+        """
+        Chunk, embed and index a stream of page texts as a pipeline.
+
+        Extraction (the `texts` iterable), chunking and batched embedding each
+        run in their own thread connected by bounded queues, so the first
+        chunks are embedded while later pages are still being extracted and
+        memory stays flat however long the document is.
+
+        While the pipeline runs, the partial index is saved every
+        `checkpoint_seconds` so the session can already be queried.
+
+        Args:
+            texts: Iterable of page texts, consumed lazily
+            session_id: Id to store the index under, a new one is generated if omitted
+            on_progress: Optional callback(chunks_embedded, chunks_total), the
+                total is None as it is only known at the end
+            on_checkpoint: Optional callback(pages_indexed, complete) called
+                after the index has been saved
+            source_index: Optional SourceIndex filled while `texts` is
+                consumed; the blocks each chunk covers are then stored in its
+                metadata under "sources"
+            filename: Optional name of the document, recorded in the catalog
+        """
+        import faiss
+        from langchain.schema import Document
         try:
-            chunks = text_splitter.create_documents([text])
-            if not chunks:
-                raise ValueError("No valid text chunks created")
-
-            MAX_CHUNKS = 1000
-            if len(chunks) > MAX_CHUNKS:
-                chunks = chunks[:MAX_CHUNKS]
-
-            chunk_mapping = {}
-            embeddings_list = []
-            docstore = {} #Initialize docstore here
-            index_to_docstore_id = {} #Initialize the mapping here
-
-            for i, chunk in enumerate(chunks):
-                chunk_id = str(uuid.uuid4())
-                chunk_mapping[chunk_id] = chunk.page_content[:1000]
-                chunk.metadata['chunk_id'] = chunk_id
-                embeddings_list.append(embeddings.embed_query(chunk.page_content))
-                docstore[chunk_id] = chunk #Use chunk_id as key
-                index_to_docstore_id[i] = chunk_id #Map index i to the correct chunk_id
-
-            embeddings_array = np.array(embeddings_list).astype("float32")
-            d = embeddings_array.shape[1]
-
-            index = faiss.IndexFlatL2(d)
-            index.add(embeddings_array)
-
-            vectorstore = FAISS(embeddings.embed_query, index, docstore, index_to_docstore_id)
-
-            session_id = str(uuid.uuid4())
+            session_id = session_id or str(uuid.uuid4())
             session_dir = self.TEMP_DIR / session_id
             session_dir.mkdir(exist_ok=True)
 
-            metadata = {"last_used": datetime.now().isoformat()}
-            with open(session_dir / "metadata.json", "w") as f:
-                json.dump(metadata, f)
+            self.catalog.create_session(session_id, filename)
 
-            self.save_vectorstore(session_id, vectorstore)
+            chunk_mapping = {}
+            index = None
+            pages_indexed = 0
+            last_checkpoint = None
+
+            def chunk_stage(page_texts):
+                return batched(self.iter_chunks(page_texts), config.INGESTION_CONFIG['embed_batch_size'])
+
+            def embed_stage(batches):
+                return embed_batches(
+                    self.embeddings, batches, lambda batch: [chunk_text for chunk_text, _, _ in batch]
+                )
+
+            def checkpoint(complete):
+                self.save_index(session_id, index)
+                self.catalog.update_document(session_id, pages_indexed, index.ntotal, complete)
+                # The bundle is only final once the features are saved too
+                self.bundles.publish(session_id, complete=False)
+                if on_checkpoint:
+                    on_checkpoint(pages_indexed, complete)
+
+            for batch, batch_embeddings in run_pipeline(
+                texts, chunk_stage, embed_stage, maxsize=config.INGESTION_CONFIG['queue_size']
+            ):
+                embeddings_array = np.array(batch_embeddings).astype("float32")
+                if index is None:
+                    index = faiss.IndexFlatL2(embeddings_array.shape[1])
+
+                batch_docs = []
+                for chunk_text, page_num, start in batch:
+                    chunk_id = str(uuid.uuid4())
+                    chunk_mapping[chunk_id] = chunk_text[:1000]
+                    metadata = {"chunk_id": chunk_id, "page": page_num}
+                    # Pages are registered before their text is chunked, so the
+                    # blocks behind this chunk are already in the source index
+                    if source_index is not None and start is not None:
+                        metadata["sources"] = source_index.locate(start, start + len(chunk_text))
+                    batch_docs.append(Document(page_content=chunk_text, metadata=metadata))
+                    pages_indexed = page_num + 1
+
+                # Rows first: the saved index never has rows without their chunks
+                self.catalog.add_chunks(session_id, index.ntotal, batch_docs)
+                index.add(embeddings_array)
+
+                if on_progress:
+                    on_progress(index.ntotal, None)
+
+                # The first checkpoint makes the session searchable as early as possible
+                if last_checkpoint is None or time.time() - last_checkpoint > config.INGESTION_CONFIG['checkpoint_seconds']:
+                    checkpoint(complete=False)
+                    last_checkpoint = time.time()
+
+            if index is None:
+                raise ValueError("No valid text chunks created")
+
+            checkpoint(complete=True)
 
-            self.cleanup_old_indices()
+            # Old indices are evicted by the IndexJanitor, off the request path
             return session_id, chunk_mapping
 
         except Exception as e:
             raise ValueError(f"Error in vectorstore creation: {str(e)}")
 
-    def save_vectorstore(self, session_id, vectorstore):
-        """Save vectorstore to disk"""
-        session_dir = self.TEMP_DIR / session_id
-        index_path = session_dir / "index.bin"
-        data_path = session_dir / "data.json"
-
-        faiss.write_index(vectorstore.index, str(index_path))
-
-        docstore_data = []
-        for doc_id, doc in vectorstore.docstore.items():
-            docstore_data.append({
-                "doc_id": doc_id,
-                "page_content": doc.page_content,
-                "metadata": doc.metadata,
-            })
-
-        data = {
-            "docstore": docstore_data,
-            "index_to_docstore_id": vectorstore.index_to_docstore_id
-        }
-
-        with open(data_path, "w") as f:
-            json.dump(data, f, indent=4, default=str)
+    def _write_atomic(self, path, write):
+        """Write through a temporary file so concurrent readers never see a partial file"""
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def save_index(self, session_id, index):
+        """Save the FAISS index of a session (its chunks live in the catalog)"""
+        import faiss
+        index_path = self.TEMP_DIR / session_id / "index.bin"
+        self._write_atomic(index_path, lambda path: faiss.write_index(index, str(path)))
+
+    def load_chunk_mapping(self, session_id, chunk_ids):
+        """Fetch the texts of just the given chunks of the session from the catalog"""
+        return self.catalog.fetch_chunks(session_id, chunk_ids)
+
+    def save_features(self, session_id, features):
+        """Save the highlighting features next to the session's index"""
+        features.save(self.TEMP_DIR / session_id / "features")
+        self.bundles.publish(session_id, complete=True)
+
+    def load_features(self, session_id):
+        """Memory-map the highlighting features of a session, None if not built yet"""
+        try:
+            self.bundles.ensure(session_id)
+            return FeatureStore.load(self.TEMP_DIR / session_id / "features")
+        except (OSError, ValueError) as e:
+            print(f"Error loading features: {type(e).__name__}: {str(e)}")
+            return None
 
     def load_vectorstore(self, session_id):
-        """Load vectorstore from disk"""
+        """
+        Load the index of a session; chunks are fetched from the catalog on
+        demand, only for the rows a search returns
+        """
+        import faiss
+        from langchain_community.vectorstores import FAISS
         try:
-            session_dir = self.TEMP_DIR / session_id
-            index_path = session_dir / "index.bin"
-            data_path = session_dir / "data.json"
-            metadata_file = session_dir / "metadata.json"
-
-            if not data_path.exists() or not metadata_file.exists() or not index_path.exists():
+            # Sessions indexed on another node are fetched into the local cache first
+            self.bundles.ensure(session_id)
+            metadata = self.catalog.touch(session_id)
+            index_path = self.TEMP_DIR / session_id / "index.bin"
+            if metadata is None or not index_path.exists():
                 raise ValueError("Vector store files not found")
 
-            with open(data_path, "r") as f:
-                data = json.load(f)
-
-            with open(metadata_file, "r+") as f:
-                metadata = json.load(f)
-                metadata["last_used"] = datetime.now().isoformat()
-                f.seek(0)
-                json.dump(metadata, f, indent=4)
-                f.truncate()
-
             index = faiss.read_index(str(index_path))
-
-            docstore = {}
-            index_to_docstore_id = data.get("index_to_docstore_id",{}) #Get the index mapping, default to empty dict
-
-            if not index_to_docstore_id:
-                raise ValueError("index_to_docstore_id is missing from saved data")
-
-            for doc_data in data["docstore"]:
-                doc_id = doc_data.get("doc_id") #Get doc_id safely
-                if not doc_id:
-                    raise ValueError("doc_id is missing from saved doc data")
-                docstore[doc_id] = Document(page_content=doc_data["page_content"], metadata=doc_data["metadata"])
-
-            vectorstore = FAISS(embeddings.embed_query, index, docstore, index_to_docstore_id)
+            vectorstore = FAISS(self.embeddings.embed_query, index, CatalogDocstore(self.catalog, session_id), {})
             return vectorstore, metadata
 
-        except (FileNotFoundError, json.JSONDecodeError, RuntimeError, ValueError) as e:
+        except (OSError, sqlite3.Error, RuntimeError, ValueError) as e:
             print(f"Error loading vectorstore: {type(e).__name__}: {str(e)}") #Print detailed error
             return None, None #Return None to indicate failure 
 
-    def cleanup_old_indices(self):
-        """Clean up indices older than 1 hour or marked for deletion"""
-        now = datetime.now()
-        for session_dir in self.TEMP_DIR.glob("*"):
-            try:
-                metadata_file = session_dir / "metadata.json"
-                if metadata_file.exists():
-                    with open(metadata_file, "r") as f:
-                        metadata = json.load(f)
-                    last_used = datetime.fromisoformat(
-                        metadata.get("last_used", now.isoformat())
-                    )
-                    delete_flag = metadata.get("delete", False)
-
-                    if (now - last_used).total_seconds() > 3600 or delete_flag:
-                        shutil.rmtree(session_dir)
-                else:
-                    shutil.rmtree(session_dir)
-            except Exception as e:
-                print(f"Error cleaning up {session_dir}: {e}")
-
     def get_relevant_chunks(self, vectorstore, query, k=5):
         """Retrieve k most relevant chunks and calculate relevance scores"""
         if not vectorstore:
@@ -174,13 +288,15 @@ class VectorStoreService:
 
         index = vectorstore.index
         D, I = index.search(query_vector, k)
+
+        # Only the k hits are read from the catalog
+        docs = vectorstore.docstore.fetch_rows([int(i) for i in I[0] if i != -1])
         
         relevant_chunks = []
         for i, distance in zip(I[0], D[0]):
             if i != -1:
                 try:
-                    doc_id = vectorstore.index_to_docstore_id[str(i)]
-                    doc = vectorstore.docstore[doc_id]
+                    doc = docs[int(i)]
                     
                     similarity = np.exp(-distance)
                     
@@ -188,7 +304,8 @@ class VectorStoreService:
                         relevant_chunks.append({
                             'chunk_id': doc.metadata.get('chunk_id'),
                             'content': doc.page_content,
-                            'score': similarity
+                            'score': similarity,
+                            'sources': doc.metadata.get('sources')
                         })
                 except KeyError as e:
                     print(f"KeyError for index {i}: {e}")
@@ -0,0 +1,19 @@
+from services.catalog import IndexCatalog
+
+
+def session_data(chunk_ids):
+    return {
+        "document": ["doc.txt", 1, len(chunk_ids), 1],
+        "chunks": [[row, chunk_id, 0, f"text of {chunk_id}", "{}"] for row, chunk_id in enumerate(chunk_ids)]
+    }
+
+
+def test_fetch_chunks_stays_within_the_session(tmp_path):
+    catalog = IndexCatalog(tmp_path / "catalog.db")
+    catalog.import_session("a", session_data(["a-1", "a-2"]))
+    catalog.import_session("b", session_data(["b-1"]))
+
+    assert catalog.fetch_chunks("a", ["a-2", "a-1"]) == {"a-1": "text of a-1", "a-2": "text of a-2"}
+    assert catalog.fetch_chunks("a", ["a-1", "b-1"]) == {"a-1": "text of a-1"}
+    assert catalog.fetch_chunks("b", ["a-1"]) == {}
+    assert catalog.fetch_chunks("a", []) == {}
@@ -0,0 +1,14 @@
+import pytest
+
+pytest.importorskip("dash")
+
+from scripts.import_report import BUDGET_SECONDS, first_page
+
+
+def test_first_page_is_served_cold_within_budget():
+    # A fresh interpreter builds the app and serves "/" and "/_dash-layout"
+    elapsed, timings = first_page()
+
+    assert timings["status"] == [200, 200]
+    assert timings["loaded"] == [], f"loaded before first use: {timings['loaded']}"
+    assert elapsed <= BUDGET_SECONDS
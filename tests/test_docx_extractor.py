@@ -0,0 +1,50 @@
+import pytest
+
+docx = pytest.importorskip("docx")
+from docx.enum.text import WD_BREAK
+from services.docx_extractor import DocxExtractor
+
+
+def build_document(path):
+    document = docx.Document()
+    paragraph = document.add_paragraph()
+    paragraph.add_run("The exam")
+    paragraph.add_run("ple").italic = True
+    paragraph.add_run(" shows it.")
+
+    paragraph = document.add_paragraph()
+    paragraph.add_run("before break")
+    paragraph.add_run().add_break(WD_BREAK.PAGE)
+    paragraph.add_run("after break")
+
+    table = document.add_table(rows=2, cols=3)
+    table.cell(0, 0).merge(table.cell(0, 1)).text = "merged"
+    table.cell(0, 2).text = "c"
+    for column, text in enumerate("xyz"):
+        table.cell(1, column).text = text
+    document.save(str(path))
+
+
+def test_runs_split_inside_words_join_without_spaces(tmp_path):
+    build_document(tmp_path / "doc.docx")
+    pages = list(DocxExtractor(tmp_path / "doc.docx").iter_pages())
+
+    assert pages[0].plain_text() == "The example shows it. before break"
+    assert pages[0].span_texts()[:3] == ["The exam", "ple", " shows it."]
+
+
+def test_page_break_inside_paragraph_starts_next_page(tmp_path):
+    build_document(tmp_path / "doc.docx")
+    pages = list(DocxExtractor(tmp_path / "doc.docx").iter_pages())
+
+    assert len(pages) == 2
+    assert pages[1].plain_text().startswith("after break")
+
+
+def test_merged_cells_are_kept_once(tmp_path):
+    build_document(tmp_path / "doc.docx")
+    extractor = DocxExtractor(tmp_path / "doc.docx")
+    pages = list(extractor.iter_pages())
+
+    assert pages[1].plain_text() == "after break merged c x y z"
+    assert extractor.tables[0].values.tolist() == [["merged", "", "c"], ["x", "y", "z"]]
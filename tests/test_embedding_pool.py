@@ -0,0 +1,62 @@
+import os
+import numpy as np
+import pytest
+from services.embedding_pool import EmbeddingPool, embed_batches
+
+
+class StubModel:
+    """Embeds a text as (length, 1, 1); a worker embedding "die" exits at once"""
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts):
+        if "die" in texts:
+            os._exit(3)
+        return [[float(len(text)), 1.0, 1.0] for text in texts]
+
+
+@pytest.fixture
+def pool():
+    pool = EmbeddingPool(StubModel(), 2, max_batch=4)
+    yield pool
+    if pool._state is not None:
+        pool._state.shutdown()
+
+
+def test_rows_keep_input_order(pool):
+    texts = ["x" * (i % 7 + 1) for i in range(50)]
+    vectors = pool.embed_documents(texts)
+
+    assert vectors.shape == (50, 3)
+    assert vectors[:, 0].tolist() == [len(text) for text in texts]
+
+
+def test_batches_come_back_in_order(pool):
+    batches = [["a" * n] * 3 for n in range(1, 12)]
+    results = list(embed_batches(pool, batches, lambda batch: batch))
+
+    assert [batch for batch, _ in results] == batches
+    assert [vectors[0, 0] for _, vectors in results] == list(range(1, 12))
+
+
+def test_empty_input(pool):
+    assert pool.embed_documents([]).shape[0] == 0
+
+
+def test_worker_death_fails_the_batch_and_the_pool_recovers(pool):
+    pool.embed_documents(["warm"])
+    with pytest.raises(RuntimeError):
+        pool.embed_documents(["ok", "die"])
+
+    assert pool.embed_documents(["again"])[:, 0].tolist() == [5.0]
+
+
+def test_stats(pool):
+    pool.embed_documents(["a", "bb", "ccc"])
+    stats = pool.stats()
+
+    assert stats["workers"] == 2
+    assert stats["queue_depth"] == 0
+    assert stats["texts_done"] == 3
+    assert stats["texts_per_second"] > 0
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("transformers")
+langchain_huggingface = pytest.importorskip("langchain_huggingface")
+
+from app import config
+from scripts.benchmark_embeddings import sample_texts
+from services.embeddings import OnnxEmbeddings
+
+# Same thresholds as scripts/benchmark_embeddings.py
+MIN_COSINE = {False: 0.999, True: 0.97}
+
+
+def normalized(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+@pytest.fixture(scope="module")
+def texts():
+    return sample_texts(64)
+
+
+@pytest.fixture(scope="module")
+def reference(texts):
+    try:
+        model = langchain_huggingface.HuggingFaceEmbeddings(
+            model_name=config.EMBEDDINGS_MODEL['name'],
+            model_kwargs={'device': 'cpu'}
+        )
+    except OSError as e:
+        pytest.skip(f"embedding model unavailable: {e}")
+    return normalized(model.embed_documents(texts))
+
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("onnx")
+
+
+@pytest.mark.parametrize("quantize", [False, True], ids=["fp32", "int8"])
+def test_onnx_matches_torch(quantize, texts, reference, onnx_dir):
+    embeddings = OnnxEmbeddings(
+        config.EMBEDDINGS_MODEL['name'],
+        onnx_dir,
+        quantize=quantize,
+        max_length=config.EMBEDDINGS_MODEL['max_length']
+    )
+    cosine = np.sum(normalized(embeddings.embed_documents(texts)) * reference, axis=1)
+
+    assert cosine.min() >= MIN_COSINE[quantize]
@@ -0,0 +1,57 @@
+from services.catalog import IndexCatalog
+from services.index_storage import IndexBundles, SharedDirStorage
+
+
+def node(root, storage):
+    """The index directory, catalog and bundles of one node"""
+    catalog = IndexCatalog(root / "catalog.db")
+    return root, catalog, IndexBundles(root, storage, catalog, check_seconds=0, partial_publish_seconds=1)
+
+
+def local_files(session_dir):
+    return {
+        path.relative_to(session_dir).as_posix(): path.read_bytes()
+        for path in session_dir.rglob("*") if path.is_file() and path.name != "manifest.json"
+    }
+
+
+def test_publish_and_ensure_round_trip(tmp_path):
+    storage = SharedDirStorage(tmp_path / "shared")
+    writer_root, writer_catalog, writer = node(tmp_path / "writer", storage)
+    reader_root, reader_catalog, reader = node(tmp_path / "reader", storage)
+
+    session_dir = writer_root / "s1"
+    (session_dir / "features").mkdir(parents=True)
+    (session_dir / "index.bin").write_bytes(b"index v1")
+    (session_dir / "features" / "ids.npy").write_bytes(b"ids v1")
+    (session_dir / "features" / "pages.npy").write_bytes(b"pages")
+    # A features directory still being written is not part of the bundle
+    (session_dir / "features.abc.tmp").mkdir()
+    (session_dir / "features.abc.tmp" / "ids.npy").write_bytes(b"partial")
+    writer_catalog.import_session("s1", {
+        "document": ["doc.txt", 1, 1, 0],
+        "chunks": [[0, "c1", 0, "chunk text", "{}"]]
+    })
+
+    writer.publish("s1", complete=False)
+    assert not (tmp_path / "shared" / "s1" / "features.abc.tmp").exists()
+
+    reader.ensure("s1")
+    expected = {
+        "index.bin": b"index v1",
+        "features/ids.npy": b"ids v1",
+        "features/pages.npy": b"pages",
+        "chunks.json": (session_dir / "chunks.json").read_bytes(),
+    }
+    assert local_files(reader_root / "s1") == expected
+    assert reader_catalog.fetch_chunks("s1", ["c1"]) == {"c1": "chunk text"}
+
+    # Only features/ids.npy changes; the features directory is swapped in whole
+    (session_dir / "features" / "ids.npy").write_bytes(b"ids version 2")
+    writer.publish("s1", complete=True)
+    reader.ensure("s1")
+    expected["features/ids.npy"] = b"ids version 2"
+    expected["chunks.json"] = (session_dir / "chunks.json").read_bytes()
+    assert local_files(reader_root / "s1") == expected
+    assert reader._read_manifest(reader_root / "s1")["complete"]
+    assert not list((reader_root / "s1").glob("*.tmp"))
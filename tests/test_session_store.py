@@ -0,0 +1,22 @@
+import os
+import threading
+import time
+from services import session_store
+from services.session_store import SessionStore
+
+
+def test_expiry_runs_in_the_sweeper_not_in_put(tmp_path):
+    store = SessionStore(root=tmp_path, ttl_seconds=1)
+    store.put("old", "state", {"a": 1})
+    stale = time.time() - 10
+    os.utime(tmp_path / "old" / "state.pkl", (stale, stale))
+    store._memory[("old", "state")]["last_access"] = stale
+
+    store.put("new", "state", {"b": 2})
+    assert (tmp_path / "old").exists()
+    assert any(thread.name == "session-sweeper" for thread in threading.enumerate())
+
+    session_store._sweep_once()
+    assert not (tmp_path / "old").exists()
+    assert ("old", "state") not in store._memory
+    assert store.get("new", "state") == {"b": 2}
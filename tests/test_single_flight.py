@@ -0,0 +1,119 @@
+import threading
+import time
+from services.single_flight import SingleFlight
+
+
+def gated_stream(tokens, gate, started=None, closed=None):
+    """Produce `tokens`, each one only once `gate` is set"""
+    def produce():
+        if started is not None:
+            started.set()
+        try:
+            for token in tokens:
+                gate.wait(5)
+                yield token
+        finally:
+            if closed is not None:
+                closed.set()
+    return produce
+
+
+def collect(flights, key, produce, results, name, cancelled=None):
+    try:
+        results[name] = list(flights.stream(key, produce, cancelled))
+    except Exception as e:
+        results[name] = e
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_identical_requests_share_one_call():
+    flights = SingleFlight()
+    gate = threading.Event()
+    calls = []
+
+    def produce():
+        calls.append(1)
+        return gated_stream(["a", "b", "c"], gate)()
+
+    results = {}
+    threads = [
+        threading.Thread(target=collect, args=(flights, "key", produce, results, name))
+        for name in ("first", "second", "third")
+    ]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: "key" in flights._flights and flights._flights["key"].waiters == 3)
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == {name: ["a", "b", "c"] for name in ("first", "second", "third")}
+    assert flights._flights == {}
+
+
+def test_cancelling_the_last_waiter_closes_the_stream():
+    flights = SingleFlight()
+    gate, started, closed = threading.Event(), threading.Event(), threading.Event()
+    cancel = threading.Event()
+
+    results = {}
+    thread = threading.Thread(
+        target=collect,
+        args=(flights, "key", gated_stream(["a", "b"], gate, started, closed), results, "only", cancel.is_set)
+    )
+    thread.start()
+    started.wait(5)
+    cancel.set()
+    thread.join(5)
+
+    assert results["only"] == []
+    assert "key" not in flights._flights
+    # The producer is closed once it hands over its next token
+    gate.set()
+    assert closed.wait(5)
+
+
+def test_request_arriving_at_abandonment_gets_a_complete_answer():
+    flights = SingleFlight()
+    first_gate, first_started = threading.Event(), threading.Event()
+    cancel = threading.Event()
+
+    results = {}
+    abandoned = threading.Thread(
+        target=collect,
+        args=(flights, "key", gated_stream(["partial"], first_gate, first_started), results, "abandoned", cancel.is_set)
+    )
+    abandoned.start()
+    first_started.wait(5)
+    old_flight = flights._flights["key"]
+    with flights._lock:
+        # Leaving takes the registry lock: while a request holds it, looking
+        # the flight up, the last waiter cannot drop the count to zero
+        cancel.set()
+        time.sleep(0.3)
+        assert old_flight.waiters == 1
+    abandoned.join(5)
+
+    # The abandoned call is still running, a new request must not attach to it
+    second_gate = threading.Event()
+    second_gate.set()
+    late = threading.Thread(
+        target=collect,
+        args=(flights, "key", gated_stream(["x", "y"], second_gate), results, "late")
+    )
+    late.start()
+    late.join(5)
+    first_gate.set()
+    wait_for(lambda: old_flight.done)
+
+    assert results["late"] == ["x", "y"]
+    assert old_flight.abandoned
+    assert old_flight.error is not None
+    assert old_flight.tokens == []
@@ -0,0 +1,56 @@
+from utils.text_helpers import TextProcessor
+
+
+def sections(content):
+    return [(section.type, section.text) for section in TextProcessor.iter_sections(content)]
+
+
+def test_fenced_code_keeps_blank_lines_and_drops_the_fences():
+    content = "# Title\nIntro line one\nline two\n\n```python\nx = 1\n\ny = 2\n```\nAfter fence\n"
+    assert sections(content) == [
+        ("heading", "# Title"),
+        ("paragraph", "Intro line one\nline two"),
+        ("code", "x = 1\n\ny = 2"),
+        ("paragraph", "After fence"),
+    ]
+
+
+def test_fence_closes_only_on_a_matching_fence():
+    content = "~~~~\n```\ninside\n~~~~\n## Sub\ntext\n"
+    assert sections(content) == [("code", "```\ninside"), ("heading", "## Sub"), ("paragraph", "text")]
+
+
+def test_indented_code_starts_only_after_a_blank_line():
+    content = "Para\n    not code\n\n    code line\n    more\n\nBack to text\n"
+    assert sections(content) == [
+        ("paragraph", "Para\n    not code"),
+        ("code", "    code line\n    more"),
+        ("paragraph", "Back to text"),
+    ]
+
+
+def test_code_runs_until_an_unindented_line_after_a_blank_line():
+    content = "def f():\n    a = 1\n\n    return a\n\nText after\n"
+    assert sections(content) == [("code", "def f():\n    a = 1\n\n    return a"), ("paragraph", "Text after")]
+
+
+def test_heading_needs_a_space_after_the_hashes():
+    assert sections("#hashtag\n### Three\n") == [("paragraph", "#hashtag"), ("heading", "### Three")]
+
+
+def test_pieces_never_cut_a_fenced_block():
+    paragraphs = "\n\n".join(f"Paragraph {i} with some words." for i in range(40))
+    code = "\n\n".join(f"line_{i} = {i}" for i in range(60))
+    content = f"{paragraphs}\n\n```\n{code}\n```\n\n{paragraphs}\n"
+
+    pieces = list(TextProcessor.iter_pieces(content, 200))
+    assert "".join(pieces) == content
+    assert len(pieces) > 3
+    streamed = [section for piece in pieces for section in sections(piece)]
+    assert streamed == sections(content)
+    assert ("code", code) in streamed
+
+
+def test_pieces_of_an_unclosed_fence_run_to_the_end():
+    content = "Intro text long enough for one piece\n\n```\n" + "x = 1\n\n" * 50
+    assert list(TextProcessor.iter_pieces(content, 20)) == ["Intro text long enough for one piece\n", content[37:]]
@@ -0,0 +1,114 @@
+from typing import Iterable, List, Tuple
+import numpy as np
+
+BOLD = 1
+ITALIC = 2
+
+# Vertical movement (in points) between two spans that starts a new visual line
+LINE_GAP = 5
+
+# Font sizes are bucketed to whole pixels between 11px and 24px (see viewer.css)
+MIN_FONT_SIZE = 11
+MAX_FONT_SIZE = 24
+
+
+def _span_class_table() -> np.ndarray:
+    """Class names of every (style flags, font size bucket) combination"""
+    table = []
+    for flags in range(4):
+        for font_size in range(MIN_FONT_SIZE, MAX_FONT_SIZE + 1):
+            class_names = ["doc-span"]
+            if flags & BOLD:
+                class_names.append("doc-bold")
+            if flags & ITALIC:
+                class_names.append("doc-italic")
+            class_names.append(f"doc-fs-{font_size}")
+            table.append(" ".join(class_names))
+    return np.array(table, dtype=object)
+
+
+SPAN_CLASSES = _span_class_table()
+
+
+class PageLayout:
+    """
+    Columnar layout of the text spans of one PDF page.
+
+    Instead of one dict per span, the span texts are concatenated into one
+    buffer with an offsets array, and the bboxes, font sizes and style flags
+    are NumPy arrays indexed by span. Line grouping, plain text and the
+    rendering classes are computed over whole arrays at once.
+
+    `span_separator` joins the spans of a line into its text: PDF spans are
+    separate pieces of text, DOCX spans are consecutive parts of one
+    paragraph (a style change may fall inside a word) and are joined as is.
+    """
+
+    __slots__ = ("text", "offsets", "bbox", "size", "flags", "span_separator")
+
+    def __init__(self, text: str, offsets: np.ndarray, bbox: np.ndarray, size: np.ndarray, flags: np.ndarray,
+                 span_separator: str = " "):
+        self.text = text
+        self.offsets = offsets
+        self.bbox = bbox
+        self.size = size
+        self.flags = flags
+        self.span_separator = span_separator
+
+    @classmethod
+    def from_spans(cls, spans: Iterable[dict], span_separator: str = " ") -> "PageLayout":
+        """Build the layout from PyMuPDF span dicts, skipping blank spans"""
+        texts = []
+        bboxes = []
+        sizes = []
+        flags = []
+        for span in spans:
+            if not span["text"].strip():
+                continue
+            font = span["font"].lower()
+            texts.append(span["text"])
+            bboxes.append(span["bbox"])
+            sizes.append(span["size"])
+            flags.append((BOLD if "bold" in font else 0) | (ITALIC if "italic" in font else 0))
+
+        offsets = np.zeros(len(texts) + 1, dtype=np.int32)
+        np.cumsum([len(text) for text in texts], out=offsets[1:])
+        return cls(
+            "".join(texts),
+            offsets,
+            np.array(bboxes, dtype=np.float32).reshape(-1, 4),
+            np.array(sizes, dtype=np.float32),
+            np.array(flags, dtype=np.uint8),
+            span_separator
+        )
+
+    def __len__(self) -> int:
+        return len(self.size)
+
+    def span_texts(self, start: int = 0, end: int = None) -> List[str]:
+        """Texts of the spans [start, end)"""
+        bounds = self.offsets[start:(len(self) if end is None else end) + 1].tolist()
+        return [self.text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def line_ranges(self) -> List[Tuple[int, int]]:
+        """Group spans into visual lines: a new line starts where y moves by more than LINE_GAP"""
+        if not len(self):
+            return []
+        breaks = np.flatnonzero(np.abs(np.diff(self.bbox[:, 1])) > LINE_GAP) + 1
+        starts = np.concatenate(([0], breaks)).tolist()
+        ends = np.concatenate((breaks, [len(self)])).tolist()
+        return list(zip(starts, ends))
+
+    def span_classes(self) -> np.ndarray:
+        """CSS class names of every span, looked up for all spans at once"""
+        font_size = np.clip(np.rint(self.size), MIN_FONT_SIZE, MAX_FONT_SIZE).astype(np.int32)
+        return SPAN_CLASSES[self.flags.astype(np.int32) * (MAX_FONT_SIZE - MIN_FONT_SIZE + 1)
+                            + font_size - MIN_FONT_SIZE]
+
+    def line_text(self, start: int, end: int) -> str:
+        """Text of the line made of the spans [start, end)"""
+        return self.span_separator.join(self.span_texts(start, end))
+
+    def plain_text(self) -> str:
+        """Line texts joined by spaces, as used for vectorization"""
+        return " ".join(self.line_text(start, end) for start, end in self.line_ranges())
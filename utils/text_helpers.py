@@ -1,131 +1,183 @@
 # utils/text_helpers.py
 
-from typing import List, Dict, Union, Optional
+from typing import Iterator, List, Dict, Union, Optional, Tuple
+from bisect import bisect_right
 import re
 from dataclasses import dataclass
 
+# One match per line tells what the line opens: a code fence, a Markdown
+# heading, a line of code, or an indented (code) line
+LINE_KIND = re.compile(
+    r'(?P<fence> {0,3}(?:`{3,}|~{3,}))'
+    r'|(?P<heading> {0,3}#{1,6}[ \t]+\S)'
+    r'|(?P<code>[ \t]*(?:def |class |import |from \S+ import |return\b|print\(|if __name__|try:|except\b|elif |else:))'
+    r'|(?P<indented>(?: {4}|\t))'
+)
+INDENT = re.compile(r'[ \t]*')
+# A code fence line anywhere in a document, with the rest of its line
+FENCE_LINE = re.compile(r'^ {0,3}(`{3,}|~{3,})(.*)$', re.MULTILINE)
+
 @dataclass
 class TextSection:
     """Data class for storing processed text sections"""
+    __slots__ = ("type", "text", "id")
     type: str  # 'paragraph', 'code', or 'heading'
     text: str
     id: int
 
 class TextProcessor:
     @staticmethod
-    def process_content(content: str):
-        """Process document content while preserving code blocks and structure"""
+    def iter_sections(content: str) -> Iterator[TextSection]:
+        """
+        Split document content into paragraph, heading and code sections, lazily.
+
+        A single pass over the lines, classifying each with one precompiled
+        pattern; section texts are sliced out of `content` rather than joined
+        from lines. Code is either fenced (``` or ~~~, the fences are left
+        out), an indented block after a blank line, or starts at a line of
+        code and runs until a blank line followed by a non-indented line that
+        is not code.
+        """
         if not content:
-            return []
-
-        def is_markdown_heading(line):
-            if not line.strip().startswith('#'):
-                return False
-            heading_level = 0
-            for char in line.strip():
-                if char != '#':
-                    break
-                heading_level += 1
-            remaining = line.strip()[heading_level:]
-            return remaining.startswith(' ') and len(remaining.strip()) > 1
-
-        def looks_like_code(text):
-            code_indicators = [
-                'def ',
-                'class ',
-                'import ',
-                #'from ',
-                'return ',
-                #'@',
-                'print(',
-                'if __name__',
-                '.py',
-                'except:',
-                'try:',
-                'else:',
-                'elif ',
-            # '##  ',
-                '    ',  # Indentation (4 spaces)
-                '\t',    # Tab character
-            ]
-            return any(indicator in text for indicator in code_indicators)
-
-        sections = []
-        current_section = []
-        in_code_block = False
-        code_block_indent = 0
-        
-        lines = content.split('\n')
-        
-        for i, line in enumerate(lines):
-            # Detect code block start
-            if not in_code_block and looks_like_code(line):
-                if current_section:
-                    sections.append({
-                        "type": "paragraph",
-                        "text": '\n'.join(current_section)
-                    })
-                    current_section = []
-                in_code_block = True
-                code_block_indent = len(line) - len(line.lstrip())
-                current_section = [line]
-                continue
+            return
 
-            # Inside code block
-            if in_code_block:
-                # Check if we're leaving the code block
-                if not line.strip():
-                    # Empty line in code block
-                    current_section.append(line)
-                elif len(line) - len(line.lstrip()) < code_block_indent and not looks_like_code(line):
-                    # End of code block
-                    sections.append({
-                        "type": "code",
-                        "text": '\n'.join(current_section)
-                    })
-                    current_section = [line]
-                    in_code_block = False
+        section_id = 0
+        kind = None             # 'paragraph', 'code' or 'fence' while a section is open
+        start = end = 0         # offsets of the open section's text in `content`
+        fence = ""
+        code_indent = 0
+        blank_before = True
+        pos = 0
+        length = len(content)
+
+        while pos < length:
+            line_end = content.find("\n", pos)
+            if line_end == -1:
+                line_end = length
+            line = content[pos:line_end]
+            next_pos = line_end + 1
+
+            if kind == "fence":
+                closing = LINE_KIND.match(line)
+                if (closing and closing.lastgroup == "fence" and closing.group()[-1] == fence[-1]
+                        and len(closing.group().lstrip()) >= len(fence) and not line[closing.end():].strip()):
+                    if end > start:
+                        yield TextSection("code", content[start:end], section_id)
+                        section_id += 1
+                    kind = None
+                    blank_before = True
                 else:
-                    # Continue code block
-                    current_section.append(line)
+                    end = line_end
+                pos = next_pos
                 continue
 
-            # Regular text processing
-            if is_markdown_heading(line):
-                if current_section:
-                    sections.append({
-                        "type": "paragraph",
-                        "text": '\n'.join(current_section)
-                    })
-                    current_section = []
-                sections.append({
-                    "type": "heading",
-                    "text": line
-                })
-            else:
-                if not line.strip() and current_section:
-                    sections.append({
-                        "type": "paragraph",
-                        "text": '\n'.join(current_section)
-                    })
-                    current_section = []
-                elif line.strip():
-                    current_section.append(line)
-
-        # Add the last section if exists
-        if current_section:
-            if in_code_block:
-                sections.append({
-                    "type": "code",
-                    "text": '\n'.join(current_section)
-                })
+            if not line or line.isspace():
+                if kind == "paragraph":
+                    yield TextSection("paragraph", content[start:end], section_id)
+                    section_id += 1
+                    kind = None
+                blank_before = True
+                pos = next_pos
+                continue
+
+            match = LINE_KIND.match(line)
+            line_kind = match.lastgroup if match else None
+
+            if kind == "code":
+                indent = INDENT.match(line).end()
+                if line_kind != "code" and (indent < code_indent or (blank_before and indent == 0)):
+                    yield TextSection("code", content[start:end], section_id)
+                    section_id += 1
+                    kind = None
+                else:
+                    if line_kind == "code":
+                        code_indent = min(code_indent, indent)
+                    end = line_end
+                    blank_before = False
+                    pos = next_pos
+                    continue
+
+            # Indented lines only start code outside a paragraph, as in Markdown
+            if line_kind == "indented" and kind == "paragraph":
+                line_kind = None
+
+            if kind == "paragraph" and line_kind is None:
+                end = line_end
             else:
-                sections.append({
-                    "type": "paragraph",
-                    "text": '\n'.join(current_section)
-                })
+                if kind == "paragraph":
+                    yield TextSection("paragraph", content[start:end], section_id)
+                    section_id += 1
+                    kind = None
+
+                if line_kind == "fence":
+                    kind = "fence"
+                    fence = match.group().lstrip()
+                    start = end = min(next_pos, length)
+                elif line_kind == "heading":
+                    yield TextSection("heading", line, section_id)
+                    section_id += 1
+                elif line_kind in ("code", "indented"):
+                    kind = "code"
+                    code_indent = INDENT.match(line).end()
+                    start, end = pos, line_end
+                else:
+                    kind = "paragraph"
+                    start, end = pos, line_end
+
+            blank_before = False
+            pos = next_pos
+
+        if kind is not None and end > start:
+            yield TextSection("paragraph" if kind == "paragraph" else "code", content[start:end], section_id)
+
+    @staticmethod
+    def _fence_spans(content: str) -> List[Tuple[int, int]]:
+        """(start, end) offsets of every fenced code block, fences included"""
+        spans = []
+        opening = None
+        for match in FENCE_LINE.finditer(content):
+            fence = match.group(1)
+            if opening is None:
+                opening = (match.start(), fence)
+            elif fence[-1] == opening[1][-1] and len(fence) >= len(opening[1]) and not match.group(2).strip():
+                spans.append((opening[0], match.end()))
+                opening = None
+        if opening is not None:
+            spans.append((opening[0], len(content)))
+        return spans
 
-        return [{"id": i, **section} for i, section in enumerate(sections)]
+    @staticmethod
+    def iter_pieces(content: str, piece_size: int) -> Iterator[str]:
+        """
+        Cut document content into pieces of at least `piece_size` characters
+        for streaming, at a paragraph break (or a line break) outside fenced
+        code blocks, so a fence and its code never end up in different pieces.
+        """
+        fences = TextProcessor._fence_spans(content)
+        fence_starts = [fence_start for fence_start, _ in fences]
+
+        def fence_end(pos):
+            # End of the fenced block holding `pos`, None outside of one
+            i = bisect_right(fence_starts, pos) - 1
+            if i >= 0 and pos < fences[i][1]:
+                return fences[i][1]
+            return None
+
+        start = 0
+        length = len(content)
+        while start < length:
+            pos = start + piece_size
+            while True:
+                pos = fence_end(pos) or pos
+                end = content.find("\n\n", pos, pos + piece_size)
+                if end == -1:
+                    end = content.find("\n", pos)
+                if end == -1 or fence_end(end) is None:
+                    break
+                pos = fence_end(end)
+            end = length if end == -1 else end + 1
+            yield content[start:end]
+            start = end
 
     @staticmethod
     def extract_text_from_component(component: Union[str, List, Dict, None]) -> str:
@@ -1,11 +1,8 @@
-import pandas as pd
+import numpy as np
 from dash import html
-from PIL import Image
-import base64
-import io
+import re
 from utils.text_helpers import TextProcessor
 from services.text_analysis import TextAnalyzer
-from dash import dcc, html, Input, Output, State, ctx
 
 text_analyzer = TextAnalyzer()
 def should_highlight(text, chunk_mapping, highlighted_chunk_ids, assistant_reply):
@@ -38,377 +35,314 @@ def should_highlight(text, chunk_mapping, highlighted_chunk_ids, assistant_reply
     # Boost score if there's significant overlap
     if has_overlap:
         similarity_score *= 1.25
-        
-    # Debug information
-    print(f"\nHighlighting Analysis:")
-    print(f"Text length: {text_length} words")
-    print(f"Similarity score: {similarity_score:.3f}")
-    print(f"Has significant overlap: {has_overlap}")
-    print(f"Applied threshold: {threshold:.3f}")
-    
+
     # Return True if either similarity score exceeds threshold or significant overlap is found
-    should_highlight = similarity_score > threshold or has_overlap
-    print(f"Highlighting decision: {'✓' if should_highlight else '✗'}")
-    
-    return should_highlight
+    return similarity_score > threshold or has_overlap
 
-def format_text_block(text_block):
-    """
-    Format text block with proper styling based on extracted properties
-    """
-    style = {
-        "margin": "0",
-        "padding": "2px 0",
-        "lineHeight": "1.5"
-    }
-    
-    # Add styling based on text properties
-    if text_block.get("is_bold"):
-        style["fontWeight"] = "bold"
-    if text_block.get("is_italic"):
-        style["fontStyle"] = "italic"
-    
-    # Scale font size relative to base size
-    base_size = 16  # Base font size in pixels
-    font_scale = text_block.get("font_size", base_size) / base_size
-    style["fontSize"] = f"{max(11, min(24, base_size * font_scale))}px"
-    
-    return html.Span(text_block["text"], style=style)
+# One part of a DataTable filter query, e.g. {Column 1} contains "abc" or {Column 2} >= 10
+FILTER_PART = re.compile(
+    r'^\{(?P<column>[^}]+)\}\s+(?P<operator>s?[<>]=?|s?!?=|eq|ne|lt|le|gt|ge|contains|datestartswith)\s+(?P<value>.*)$'
+)
+FILTER_OPERATORS = {'eq': '=', 's=': '=', 'ne': '!=', 's!=': '!=', 'lt': '<', 's<': '<', 'le': '<=',
+                    's<=': '<=', 'gt': '>', 's>': '>', 'ge': '>=', 's>=': '>='}
+
+def _filter_mask(df, part):
+    """Boolean row mask of one filter query part, None if it does not apply"""
+    import pandas as pd
+    match = FILTER_PART.match(part.strip())
+    if not match or match.group("column") not in df.columns:
+        return None
+
+    column = df[match.group("column")]
+    operator = FILTER_OPERATORS.get(match.group("operator"), match.group("operator"))
+    value = match.group("value").strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in "\"'`":
+        value = value[1:-1]
+
+    if operator == "contains":
+        return column.str.contains(value, case=False, regex=False)
+    if operator == "datestartswith":
+        return column.str.startswith(value)
+
+    # Cells are strings; compare as numbers when the value is one
+    try:
+        target = float(value)
+        column = pd.to_numeric(column, errors="coerce")
+    except ValueError:
+        target = value
+    if operator == "=":
+        return column == target
+    if operator == "!=":
+        return column != target
+    if operator == "<":
+        return column < target
+    if operator == "<=":
+        return column <= target
+    if operator == ">":
+        return column > target
+    return column >= target
+
+def _sort_key(column):
+    """Sort numeric columns by value, any other column case-insensitively"""
+    import pandas as pd
+    numbers = pd.to_numeric(column, errors="coerce")
+    if numbers.notna().sum() == (column != "").sum():
+        return numbers
+    return column.str.lower()
 
 class DocumentVisualizer:
     @staticmethod
-    def format_text_block(text_block):
-        """Format text block with proper styling based on extracted properties"""
-        style = {
-            "margin": "0",
-            "padding": "2px 0",
-            "lineHeight": "1.5"
-        }
-        
-        if text_block.get("is_bold"):
-            style["fontWeight"] = "bold"
-        if text_block.get("is_italic"):
-            style["fontStyle"] = "italic"
-        
-        base_size = 16
-        font_scale = text_block.get("font_size", base_size) / base_size
-        style["fontSize"] = f"{max(11, min(24, base_size * font_scale))}px"
-        
-        return html.Span(text_block["text"], style=style)
+    def prepare_table(df):
+        """
+        Normalize an extracted table once, column by column: string column ids
+        and stripped string cells, ready for paging, sorting and filtering
+        """
+        import pandas as pd
+        columns = {}
+        for position, column in enumerate(df.columns):
+            name = str(column).strip() or f"Column {position + 1}"
+            while name in columns:
+                name = f"{name} ({position + 1})"
+            columns[name] = df.iloc[:, position].fillna('').astype(str).str.strip()
+        return pd.DataFrame(columns, index=pd.RangeIndex(len(df)))
 
     @staticmethod
-    def table_to_html(df):
-        """Convert DataFrame to a properly rendered Dash table"""
-        if df is None or df.empty:
-            return None
-        
-        try:
-            df = df.fillna('')
-            df = df.applymap(lambda x: str(x).strip())
-            
-            header = [
-                html.Th(col, style={
-                    'backgroundColor': '#f8f9fa',
-                    'padding': '12px',
-                    'border': '1px solid #dee2e6',
-                    'textAlign': 'left'
-                }) for col in df.columns
-            ]
-            header_row = [html.Tr(header)]
-            
-            rows = []
-            for idx, row in df.iterrows():
-                cells = [
-                    html.Td(cell, style={
-                        'padding': '8px',
-                        'border': '1px solid #dee2e6',
-                        'textAlign': 'left'
-                    }) for cell in row
-                ]
-                rows.append(html.Tr(cells))
-            
-            table = html.Div([
-                html.Table(
-                    header_row + rows,
-                    style={
-                        'width': '100%',
-                        'borderCollapse': 'collapse',
-                        'marginBottom': '1rem',
-                        'backgroundColor': 'white'
-                    }
+    def query_table(df, page_current, page_size, sort_by=None, filter_query=""):
+        """
+        Apply a DataTable filter query and sort order to a prepared table and
+        cut out one page.
+
+        Returns:
+            tuple: (records of the page, page count)
+        """
+        for part in (filter_query or "").split(" && "):
+            mask = _filter_mask(df, part)
+            if mask is not None:
+                df = df[mask]
+
+        if sort_by:
+            keys = [sort["column_id"] for sort in sort_by if sort["column_id"] in df.columns]
+            if keys:
+                df = df.sort_values(
+                    keys,
+                    ascending=[sort["direction"] == "asc" for sort in sort_by if sort["column_id"] in df.columns],
+                    key=_sort_key,
+                    kind="mergesort"
                 )
-            ], style={
-                'overflowX': 'auto',
-                'marginTop': '20px',
-                'marginBottom': '20px'
+
+        page_count = max(1, -(-len(df) // page_size))
+        start = page_current * page_size
+        return df.iloc[start:start + page_size].to_dict("records"), page_count
+
+    @staticmethod
+    def build_pdf_page(page_layout, page_num):
+        """
+        Turn the columnar layout of one PDF page into renderable line blocks.
+
+        Each line keeps its spans as (text, class names) pairs; the classes of
+        the whole page are computed in one array operation.
+        """
+        texts = page_layout.span_texts()
+        classes = page_layout.span_classes().tolist()
+        blocks = []
+
+        for line_num, (start, end) in enumerate(page_layout.line_ranges()):
+            line_texts = texts[start:end]
+            blocks.append({
+                "id": f"highlight-{page_num}-{line_num}",
+                "type": "line",
+                "text": page_layout.span_separator.join(line_texts),
+                "spans": list(zip(line_texts, classes[start:end]))
             })
-            
-            return table
-            
-        except Exception as e:
-            print(f"Error converting table to HTML: {e}")
-            return None
+        return blocks
 
     @staticmethod
-    def create_highlighted_content(content, chunk_mapping, highlighted_chunk_ids, assistant_reply, images=None, tables=None):
-        """Modified content creator with improved scrolling to highlighted content"""
-        content_container = []
-        most_relevant_id = None
-        highest_similarity = 0
-        TextAn = TextAnalyzer()
-        if isinstance(content, list):  # PDF content with layout information
-            for page_num, page_content in enumerate(content):
-                page_container = []
-                current_line = []
-                current_y = None
-                
-                for line in page_content:
-                    for span in line:
-                        text = span.get("text", "").strip()
-                        if not text:
-                            continue
-                            
-                        bbox = span.get("bbox", None)
-                        y_pos = bbox[1] if bbox else None
-                        
-                        if current_y is not None and y_pos is not None and abs(y_pos - current_y) > 5:
-                            if current_line:
-                                line_text = " ".join(span["text"] for span in current_line)
-                                should_highlight_line = should_highlight(
-                                    line_text,
-                                    chunk_mapping,
-                                    highlighted_chunk_ids,
-                                    assistant_reply
-                                )
-                                
-                                # Calculate similarity score for auto-scrolling
-                                if should_highlight_line:
-                                    similarity = text_analyzer.calculate_semantic_similarity(line_text, assistant_reply)
-                                    if similarity > highest_similarity:
-                                        highest_similarity = similarity
-                                        most_relevant_id = f"highlight-{len(content_container)}"
-                                
-                                line_container = []
-                                for span_data in current_line:
-                                    formatted_span = format_text_block(span_data)
-                                    if should_highlight_line:
-                                        highlight_style = {
-                                            "backgroundColor": "#fff3cd",
-                                            "padding": "2px 4px",
-                                            "borderRadius": "2px",
-                                            "border": "1px solid #ffeeba"
-                                        }
-                                        line_container.append(
-                                            html.Div(
-                                                formatted_span,
-                                                id=f"highlight-{len(content_container)}",
-                                                style=highlight_style,
-                                                className="highlighted-text"
-                                            )
-                                        )
-                                    else:
-                                        line_container.append(formatted_span)
-                                
-                                page_container.extend([
-                                    html.Span(line_container, style={"display": "block"}),
-                                    html.Br()
-                                ])
-                                
-                                current_line = []
-                        
-                        current_line.append(span)
-                        current_y = y_pos
-                
-                # Process last line
-                if current_line:
-                    line_text = " ".join(span["text"] for span in current_line)
-                    should_highlight_line = should_highlight(
-                        line_text,
-                        chunk_mapping,
-                        highlighted_chunk_ids,
-                        assistant_reply
-                    )
-                    
-                    if should_highlight_line:
-                        similarity = text_analyzer.calculate_semantic_similarity(line_text, assistant_reply)
-                        if similarity > highest_similarity:
-                            highest_similarity = similarity
-                            most_relevant_id = f"highlight-{len(content_container)}"
-                    
-                    line_container = []
-                    for span_data in current_line:
-                        formatted_span = format_text_block(span_data)
-                        if should_highlight_line:
-                            line_container.append(
-                                html.Div(
-                                    formatted_span,
-                                    id=f"highlight-{len(content_container)}",
-                                    style={
-                                        "backgroundColor": "#fff3cd",
-                                        "padding": "2px 4px",
-                                        "borderRadius": "2px",
-                                        "border": "1px solid #ffeeba"
-                                    },
-                                    className="highlighted-text"
-                                )
-                            )
-                        else:
-                            line_container.append(formatted_span)
-                    
-                    page_container.extend([
-                        html.Span(line_container, style={"display": "block"}),
-                        html.Br()
-                    ])
-                
-                content_container.append(
-                    html.Div(
-                        page_container,
-                        style={
-                            "margin": "20px 0",
-                            "padding": "20px",
-                            "backgroundColor": "white",
-                            "borderRadius": "4px",
-                            "boxShadow": "0 1px 3px rgba(0,0,0,0.1)"
-                        }
+    def build_text_pages(text, first_page_num=0, sections_per_page=40):
+        """Cut a piece of text into virtual pages of `sections_per_page` sections"""
+        pages = []
+        page_blocks = []
+
+        for section in TextProcessor.iter_sections(text):
+            section_text = section.text.strip()
+            if not section_text:
+                continue
+            page_blocks.append({
+                "id": f"highlight-{first_page_num + len(pages)}-{len(page_blocks)}",
+                "type": section.type,
+                "text": section_text
+            })
+            if len(page_blocks) >= sections_per_page:
+                pages.append(page_blocks)
+                page_blocks = []
+        if page_blocks:
+            pages.append(page_blocks)
+
+        return pages
+
+    @staticmethod
+    def iter_text_blocks(pages):
+        """Yield (page_num, element_id, text) for every highlightable block"""
+        for page_num, page_blocks in enumerate(pages):
+            for block in page_blocks:
+                if block["type"] != "heading":
+                    yield page_num, block["id"], block["text"]
+
+    @staticmethod
+    def page_window(center, page_count, prefetch=2):
+        """Return the [start, end) range of pages rendered around `center`"""
+        center = max(0, min(center, page_count - 1))
+        return [max(0, center - prefetch), min(page_count, center + prefetch + 1)]
+
+    @staticmethod
+    def render_page(page_blocks, page_num):
+        """Render a single page of blocks"""
+        page_container = []
+
+        for block in page_blocks:
+            if block["type"] == "line":
+                page_container.append(
+                    html.Span(
+                        [html.Span(text, className=class_names) for text, class_names in block["spans"]],
+                        id=block["id"],
+                        className="doc-line"
                     )
                 )
-                
-                # Add images and page separators as before...
-                
-        else:
-            # Handle non-PDF content with similar highlighting and ID assignment...
-            text_proc = TextProcessor()
-            processed_content = text_proc.process_content(content)
-            
-            for section in processed_content:
-                if section["type"] == "heading":
-                    content_container.append(
-                        html.H3(
-                            section["text"].lstrip('#').strip(),
-                            style={
-                                'marginTop': '2rem',
-                                'marginBottom': '1rem',
-                                'fontWeight': 'bold'
-                            }
-                        )
-                    )
-                else:
-                    text = section["text"].strip()
-                    if text:
-                        should_highlight_result = should_highlight(
-                            text,
-                            chunk_mapping,
-                            highlighted_chunk_ids,
-                            assistant_reply
-                        )
-                        
-                        if should_highlight_result:
-                            similarity = text_analyzer.calculate_semantic_similarity(text, assistant_reply)
-                            if similarity > highest_similarity:
-                                highest_similarity = similarity
-                                most_relevant_id = f"highlight-{len(content_container)}"
-                        
-                        style = {
-                            'marginBottom': '1.5rem',
-                            'lineHeight': '1.6',
-                            'padding': '0.75rem',
-                        }
-                        
-                        if should_highlight_result:
-                            style.update({
-                                'backgroundColor': '#fff3cd',
-                                'borderRadius': '4px',
-                                'border': '2px solid #ffeeba',
-                                'boxShadow': '0 2px 4px rgba(0,0,0,0.1)'
-                            })
-                            content_container.append(
-                                html.Div(
-                                    text,
-                                    id=f"highlight-{len(content_container)}",
-                                    style=style,
-                                    className="highlighted-text"
-                                )
-                            )
-                        else:
-                            content_container.append(html.Div(text, style=style))
-        
-        # Add a hidden input to store the most relevant highlight ID
-        content_container.append(
-            dcc.Input(
-                id='most-relevant-highlight',
-                type='hidden',
-                value=most_relevant_id
-            )
-        )
-        
+            elif block["type"] == "heading":
+                page_container.append(
+                    html.H3(block["text"].lstrip('#').strip(), className="doc-heading")
+                )
+            else:
+                page_container.append(
+                    html.Div(block["text"], id=block["id"], className="doc-section")
+                )
+
         return html.Div(
-            content_container,
-            style={
-                "padding": "20px",
-                "backgroundColor": "#f8f9fa"
-            }
+            page_container,
+            id=f"doc-page-{page_num}",
+            className="doc-page",
+            **{"data-page": page_num}
         )
 
     @staticmethod
-    def _create_page_container(page_content, chunk_mapping, highlighted_chunk_ids, assistant_reply, content_container, update_tracking_fn):
-        """Helper method to create page container for PDF content"""
-        page_container = []
-        current_line = []
-        current_y = None
-        
-        for line in page_content:
-            DocumentVisualizer._process_line(
-                line,
-                current_line,
-                current_y,
-                page_container,
-                chunk_mapping,
-                highlighted_chunk_ids,
-                assistant_reply,
-                content_container,
-                update_tracking_fn
-            )
-        
+    def render_placeholder(page_num):
+        """Render the empty stand-in for a page outside the visible window"""
         return html.Div(
-            page_container,
-            style={
-                "margin": "20px 0",
-                "padding": "20px",
-                "backgroundColor": "white",
-                "borderRadius": "4px",
-                "boxShadow": "0 1px 3px rgba(0,0,0,0.1)"
-            }
+            f"Page {page_num + 1}",
+            id=f"doc-page-{page_num}",
+            className="doc-page doc-page-placeholder",
+            **{"data-page": page_num}
         )
 
     @staticmethod
-    def _create_regular_content(content, chunk_mapping, highlighted_chunk_ids, assistant_reply, update_tracking_fn):
-        """Helper method to create regular content container"""
-        text_proc = TextProcessor()
-        regular_container = []
-        processed_content = text_proc.process_content(content)
-        
-        for section in processed_content:
-            if section["type"] == "heading":
-                regular_container.append(
-                    html.H3(
-                        section["text"].lstrip('#').strip(),
-                        style={
-                            'marginTop': '2rem',
-                            'marginBottom': '1rem',
-                            'fontWeight': 'bold'
-                        }
-                    )
-                )
-            else:
-                DocumentVisualizer._process_section(
-                    section,
-                    regular_container,
-                    chunk_mapping,
-                    highlighted_chunk_ids,
-                    assistant_reply,
-                    update_tracking_fn
-                )
-        
-        return regular_container
+    def _highlights_from_scores(features, scores, mask):
+        """Turn feature-store scores into a highlight state for the blocks in `mask`"""
+        rows = np.flatnonzero(mask & scores["highlight"])
+        if not len(rows):
+            return {"ids": [], "scroll": None, "page": None}
+
+        best = rows[np.argmax(scores["similarity"][rows])]
+        return {
+            "ids": features.ids[rows].tolist(),
+            "scroll": str(features.ids[best]),
+            "page": int(features.pages[best])
+        }
+
+    @staticmethod
+    def lookup_highlights(chunks, assistant_reply=None, refine=False, features=None, check_cancelled=None):
+        """
+        Highlight the blocks recorded for the retrieved chunks at ingestion.
+
+        The block ids come straight from each chunk's "sources", so no page has
+        to be loaded or compared. With `refine`, the blocks are checked against
+        the answer to drop unrelated ones and to pick the scroll target (in one
+        pass over the precomputed `features` when the session has them);
+        otherwise the first block of the best chunk is scrolled to.
+
+        `check_cancelled` is called between blocks so a background caller can
+        abandon the work.
+
+        Returns:
+            dict: same shape as `compute_highlights`
+        """
+        if refine and assistant_reply and features is not None:
+            source_ids = [source["id"] for chunk in chunks for source in chunk["sources"]]
+            scores = features.score(assistant_reply, text_analyzer.embeddings, text_analyzer)
+            return DocumentVisualizer._highlights_from_scores(
+                features, scores, np.isin(features.ids, source_ids)
+            )
+
+        highlight_ids = []
+        most_relevant_id = None
+        most_relevant_page = None
+        highest_similarity = 0
+
+        for chunk in chunks:
+            for source in chunk["sources"]:
+                if source["id"] in highlight_ids:
+                    continue
+
+                if refine and assistant_reply:
+                    if check_cancelled:
+                        check_cancelled()
+                    text = chunk["content"][source["offset"]:source["offset"] + source["end"] - source["start"]]
+                    chunk_mapping = {chunk["chunk_id"]: chunk["content"]}
+                    if not should_highlight(text, chunk_mapping, [chunk["chunk_id"]], assistant_reply):
+                        continue
+                    similarity = text_analyzer.calculate_semantic_similarity(text, assistant_reply)
+                    if similarity > highest_similarity:
+                        highest_similarity = similarity
+                        most_relevant_id = source["id"]
+                        most_relevant_page = source["page"]
+                elif most_relevant_id is None:
+                    most_relevant_id = source["id"]
+                    most_relevant_page = source["page"]
+
+                highlight_ids.append(source["id"])
+
+        return {"ids": highlight_ids, "scroll": most_relevant_id, "page": most_relevant_page}
+
+    @staticmethod
+    def compute_highlights(pages, chunk_mapping, highlighted_chunk_ids, assistant_reply, features=None,
+                           check_cancelled=None):
+        """
+        Work out which rendered blocks should be highlighted for an answer by
+        comparing every block with it (used for indexes without "sources").
+
+        With precomputed `features` every block is scored in one vectorized
+        pass and `pages` is not needed. Otherwise `check_cancelled` is called
+        before each block is compared.
+
+        Returns:
+            dict: {"ids": [...], "scroll": id of the most relevant block or None,
+                   "page": page holding the scroll target or None}
+        """
+        highlight_ids = []
+        most_relevant_id = None
+        most_relevant_page = None
+        highest_similarity = 0
+
+        if not highlighted_chunk_ids or not assistant_reply:
+            return {"ids": highlight_ids, "scroll": most_relevant_id, "page": most_relevant_page}
+
+        if features is not None:
+            scores = features.score(assistant_reply, text_analyzer.embeddings, text_analyzer)
+            return DocumentVisualizer._highlights_from_scores(
+                features, scores, np.ones(len(features.ids), dtype=bool)
+            )
+
+        for page_num, element_id, text in DocumentVisualizer.iter_text_blocks(pages):
+            if check_cancelled:
+                check_cancelled()
+            if not should_highlight(text, chunk_mapping, highlighted_chunk_ids, assistant_reply):
+                continue
+
+            highlight_ids.append(element_id)
+
+            # Calculate similarity score for auto-scrolling
+            similarity = text_analyzer.calculate_semantic_similarity(text, assistant_reply)
+            if similarity > highest_similarity:
+                highest_similarity = similarity
+                most_relevant_id = element_id
+                most_relevant_page = page_num
 
-    # Additional helper methods would be included here...
\ No newline at end of file
+        return {"ids": highlight_ids, "scroll": most_relevant_id, "page": most_relevant_page}